@@ -0,0 +1,214 @@
+"""Пакетный расчёт решений по кредиту над столбцами NumPy.
+
+Расчёт ведётся во float64, а строки, в которых результат может разойтись с Decimal-расчётом
+credit_decision (платёж у границы округления до 8 знаков, отношение суммы к сроку у трети дохода),
+пересчитываются скалярно. Поэтому результат совпадает с credit_decision в точности."""
+from typing import Optional, Tuple
+
+import numpy as np
+
+import main
+
+SEXES = tuple(main.PENSION_AGES)
+INCOME_SOURCES = tuple(main.INCOME_SOURCE_MODIFIERS)
+CREDIT_RATINGS = tuple(main.CREDIT_RATING_MODIFIERS)
+AIMS = tuple(main.AIM_MODIFIERS)
+
+# Биты маски ошибок validate_columns по полям заявки
+FIELD_ERRORS = {field: 1 << index for index, field in enumerate(main.APPLICATION_FIELDS)}
+
+_UNEMPLOYED = INCOME_SOURCES.index('безработный')
+_BAD_CREDIT_RATING = CREDIT_RATINGS.index(-2)
+
+
+def _rule_arrays() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Переводит таблицу правил main в массивы, индексируемые кодами (цель, рейтинг, источник дохода):
+    модификаторы ставки и ограничения суммы (inf - без ограничения), а также пенсионный возраст по коду пола"""
+
+    shape = (len(AIMS), len(CREDIT_RATINGS), len(INCOME_SOURCES))
+    modifiers, caps = np.empty(shape), np.empty(shape)
+    for index in np.ndindex(shape):
+        modifier, cap = main._RULE_TABLE[AIMS[index[0]], CREDIT_RATINGS[index[1]], INCOME_SOURCES[index[2]]]
+        modifiers[index], caps[index] = float(modifier), np.inf if cap is None else float(cap)
+
+    return modifiers, caps, np.array([main.PENSION_AGES[sex] for sex in SEXES])
+
+
+def _object_column(column) -> np.ndarray:
+    """Переводит столбец в одномерный массив объектов. Списки и словари в ячейках остаются значениями ячеек,
+    а не разворачиваются в лишнее измерение"""
+
+    if isinstance(column, np.ndarray):
+        return column.astype(object).reshape(-1)
+    return np.fromiter(column, dtype=object, count=len(column))
+
+
+def _encode(column, domain, value_type) -> np.ndarray:
+    """Переводит категориальный столбец в индексы значений domain, -1 - недопустимое значение.
+    Значения не типа value_type недопустимы, как в main._check_inputs"""
+
+    column = _object_column(column)
+    codes = {value: code for code, value in enumerate(domain)}
+
+    def code(value) -> int:
+        # проверка типа идёт первой: нехешируемые значения (списки, словари) не доходят до словаря
+        return codes.get(value, -1) if type(value) is value_type else -1
+
+    try:
+        values, inverse = np.unique(column, return_inverse=True)
+    except TypeError:
+        # значения разных типов не сортируются, тогда столбец переводится построчно
+        return np.fromiter((code(value) for value in column.tolist()), dtype=np.intp, count=len(column))
+
+    return np.fromiter((code(value) for value in values.tolist()), dtype=np.intp,
+                       count=len(values))[inverse.reshape(-1)]
+
+
+def _item(value):
+    """Возвращает значение элемента массива как объект Python"""
+
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _numeric_column(column) -> np.ndarray:
+    """Переводит числовой столбец в массив. Значения не из массива NumPy остаются объектами Python,
+    чтобы проверка типов совпадала с main._check_inputs (например, 20.0 в возрасте - ошибка, а не 20)"""
+
+    return column if isinstance(column, np.ndarray) else _object_column(column)
+
+
+def _numeric_errors(column: np.ndarray, kinds: str, low=None, high=None) -> np.ndarray:
+    """Возвращает строки числового столбца с неверным типом или вне диапазона [low, high]"""
+
+    if column.dtype.kind == 'O':
+        types = (int,) if kinds == 'iu' else (int, float)
+        values = column.tolist()
+        valid = np.fromiter((type(value) in types for value in values), dtype=bool, count=len(values))
+        numbers = np.zeros(len(values))
+        for row in np.flatnonzero(valid).tolist():
+            try:
+                numbers[row] = values[row]
+            except OverflowError:
+                # целое, которое не помещается во float64, пакетный расчёт представить не может
+                valid[row] = False
+    elif column.dtype.kind in kinds:
+        valid = np.ones(len(column), dtype=bool)
+        numbers = column
+    else:
+        return np.ones(len(column), dtype=bool)
+
+    if low is not None:
+        valid &= numbers >= low
+    if high is not None:
+        valid &= numbers <= high
+    return ~valid
+
+
+def _prepare(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim,
+             validate: bool) -> Tuple[dict, Optional[np.ndarray]]:
+    """Переводит столбцы в массивы и коды категорий, при validate также возвращает маску ошибок по строкам"""
+
+    columns = {'age': _numeric_column(age), 'sex': _encode(sex, SEXES, str),
+               'income_source': _encode(income_source, INCOME_SOURCES, str),
+               'last_year_income': _numeric_column(last_year_income),
+               'credit_rating': _encode(credit_rating, CREDIT_RATINGS, int),
+               'requested_sum': _numeric_column(requested_sum), 'repayment_period': _numeric_column(repayment_period),
+               'aim': _encode(aim, AIMS, str)}
+    assert len({len(column) for column in columns.values()}) == 1, 'столбцы разной длины'
+    if not validate:
+        return columns, None
+
+    errors = np.zeros(len(columns['age']), dtype=np.uint8)
+    field_errors = {
+        'age': _numeric_errors(columns['age'], 'iu', main.MIN_AGE),
+        'last_year_income': _numeric_errors(columns['last_year_income'], 'iuf'),
+        'requested_sum': _numeric_errors(columns['requested_sum'], 'iuf',
+                                         main.MIN_REQUESTED_SUM, main.MAX_REQUESTED_SUM),
+        'repayment_period': _numeric_errors(columns['repayment_period'], 'iuf',
+                                            main.MIN_REPAYMENT_PERIOD, main.MAX_REPAYMENT_PERIOD),
+    }
+    for field in main.APPLICATION_FIELDS:
+        errors[field_errors[field] if field in field_errors else columns[field] < 0] |= FIELD_ERRORS[field]
+
+    return columns, errors
+
+
+def validate_columns(age, sex, income_source, last_year_income, credit_rating,
+                     requested_sum, repayment_period, aim) -> np.ndarray:
+    """Проверяет столбцы целиком по тем же правилам, что и main._check_inputs.
+    Возвращает маску ошибок по строкам (uint8, биты FIELD_ERRORS), 0 - строка корректна"""
+
+    return _prepare(age, sex, income_source, last_year_income, credit_rating,
+                    requested_sum, repayment_period, aim, validate=True)[1]
+
+
+def credit_decision_batch(age, sex, income_source, last_year_income, credit_rating,
+                          requested_sum, repayment_period, aim,
+                          trusted: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Векторный аналог credit_decision.
+    Принимает столбцы входных данных одинаковой длины и возвращает три массива:
+    решение (bool), годовой платёж (float, NaN при отказе) и битовую маску причин отказа (uint8, см. main.REASON_*).
+    При некорректных строках выбрасывает AssertionError, для отбора таких строк заранее есть validate_columns.
+    При trusted=True столбцы считаются уже проверенными и не проверяются"""
+
+    columns, errors = _prepare(age, sex, income_source, last_year_income, credit_rating,
+                               requested_sum, repayment_period, aim, validate=not trusted)
+    if errors is not None:
+        invalid_rows = np.flatnonzero(errors)
+        assert not len(invalid_rows), f'некорректные строки: {invalid_rows[:10].tolist()}'
+
+    return credit_decision_codes(columns['age'], columns['sex'], columns['income_source'],
+                                 columns['last_year_income'], columns['credit_rating'], columns['requested_sum'],
+                                 columns['repayment_period'], columns['aim'])
+
+
+def credit_decision_codes(age, sex_codes, income_source_codes, last_year_income, credit_rating_codes,
+                          requested_sum, repayment_period, aim_codes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Вариант credit_decision_batch для уже проверенных столбцов, в которых категории заданы кодами -
+    индексами в SEXES, INCOME_SOURCES, CREDIT_RATINGS и AIMS. Столбцы не копируются и не проверяются"""
+
+    age = np.asarray(age)
+    if age.dtype.kind == 'O':
+        age = age.astype(np.int64)
+    sex_codes, income_source_codes = np.asarray(sex_codes), np.asarray(income_source_codes)
+    credit_rating_codes, aim_codes = np.asarray(credit_rating_codes), np.asarray(aim_codes)
+    last_year_income, requested_sum = np.asarray(last_year_income), np.asarray(requested_sum)
+    repayment_period = np.asarray(repayment_period)
+
+    credit_sum = np.asarray(requested_sum, dtype=np.float64)
+    period = np.asarray(repayment_period, dtype=np.float64)
+    income = np.asarray(last_year_income, dtype=np.float64)
+
+    modifiers, caps, pension_ages = _rule_arrays()
+    rule_index = (aim_codes, credit_rating_codes, income_source_codes)
+    credit_sum_cap = caps[rule_index]
+    allowed_credit_sum = np.minimum(credit_sum, credit_sum_cap)
+
+    interest_rate_modifier = modifiers[rule_index] - np.log10(credit_sum) * float(main._SUM_MODIFIER_FACTOR)
+    annual_payment = (allowed_credit_sum * (1 + period * (float(main.BASIC_INTEREST_RATE) + interest_rate_modifier))
+                      / period)
+
+    scaled_payment = annual_payment * 1e8
+    annual_payment = np.rint(scaled_payment) / 1e8
+    ambiguous = np.abs(scaled_payment - np.floor(scaled_payment) - 0.5) < main._FLOAT_ROUNDING_TOLERANCE
+
+    sum_by_period = credit_sum / period
+    third_of_income = income / 3
+    ambiguous |= np.abs(sum_by_period - third_of_income) <= main._FLOAT_RATIO_TOLERANCE * sum_by_period
+
+    denial_mask = np.zeros(len(credit_sum), dtype=np.uint8)
+    denial_mask[credit_sum > credit_sum_cap] |= main.REASON_SUM_OVER_ALLOWED
+    denial_mask[period > pension_ages[sex_codes] - age] |= main.REASON_PENSION_AGE
+    denial_mask[sum_by_period > third_of_income] |= main.REASON_INCOME_RATIO
+    denial_mask[credit_rating_codes == _BAD_CREDIT_RATING] |= main.REASON_CREDIT_RATING
+    denial_mask[income_source_codes == _UNEMPLOYED] |= main.REASON_NO_INCOME
+    denial_mask[annual_payment > income / 2] |= main.REASON_PAYMENT_OVER_HALF_INCOME
+
+    for row in np.flatnonzero(ambiguous).tolist():
+        _, annual_payment[row], _, _, denial_mask[row] = main._evaluate(
+            _item(age[row]), SEXES[sex_codes[row]], INCOME_SOURCES[income_source_codes[row]],
+            _item(last_year_income[row]), CREDIT_RATINGS[credit_rating_codes[row]],
+            _item(requested_sum[row]), _item(repayment_period[row]), AIMS[aim_codes[row]])
+
+    verdict = denial_mask == 0
+    return verdict, np.where(verdict, annual_payment, np.nan), denial_mask
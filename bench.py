@@ -0,0 +1,252 @@
+"""Бенчмарки credit_decision.
+
+Заявки генерируются с фиксированным зерном в диапазонах входных данных из README:
+mixed - равномерно по всем диапазонам, edge - значения на границах условий
+(лимиты сумм, пенсионный возраст, треть и половина дохода).
+
+Для каждого режима выводятся вызовы в секунду, нс на вызов, пиковая память за прогон
+и пиковая память одного вызова (CPython не даёт счётчика числа выделений, поэтому выделения на вызов
+оцениваются объёмом временной памяти, занятой за время вызова).
+
+python bench.py --save baseline.json - сохранить результаты
+Режимы startup/* замеряют холодный старт в новом процессе: время импорта и первого вызова
+(ns_per_call - их сумма, peak_kib - пиковый размер процесса) для main.credit_decision и worker.handle.
+
+python bench.py --compare baseline.json --threshold 0.1 - сравнить с сохранёнными, код выхода 1 при замедлении"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from random import Random
+from typing import Callable, Optional
+
+import main
+
+SEXES = tuple(main.PENSION_AGES)
+INCOME_SOURCES = tuple(main.INCOME_SOURCE_MODIFIERS)
+CREDIT_RATINGS = tuple(main.CREDIT_RATING_MODIFIERS)
+AIMS = tuple(main.AIM_MODIFIERS)
+
+DEFAULT_COUNT = 20000
+DEFAULT_SEED = 0
+DEFAULT_THRESHOLD = 0.1
+_MEMORY_SAMPLE = 200
+
+# Импорт и первый вызов для замера холодного старта: main.credit_decision без печати и лёгкая точка входа worker
+STARTUP_MODES = {
+    'main': ('import main', 'main.VERBOSE = False\nmain.credit_decision(**application)'),
+    'worker': ('import worker', 'worker.handle(application)'),
+}
+_STARTUP_SCRIPT = """
+import time
+application = {application!r}
+started = time.perf_counter_ns()
+{import_statement}
+imported = time.perf_counter_ns()
+{call}
+called = time.perf_counter_ns()
+import json, resource
+print(json.dumps([imported - started, called - imported, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss]))
+"""
+
+
+def _mixed_application(rnd: Random) -> dict:
+    return {'age': rnd.randint(18, 70), 'sex': rnd.choice(SEXES), 'income_source': rnd.choice(INCOME_SOURCES),
+            'last_year_income': round(rnd.uniform(0, 10), 2), 'credit_rating': rnd.choice(CREDIT_RATINGS),
+            'requested_sum': round(rnd.uniform(0.1, 10), 2), 'repayment_period': rnd.randint(1, 20),
+            'aim': rnd.choice(AIMS)}
+
+
+def _edge_application(rnd: Random) -> dict:
+    application = _mixed_application(rnd)
+    sex = application['sex']
+    requested_sum = rnd.choice((0.1, 1, 5, 10, 1.01, 5.01))
+    repayment_period = rnd.choice((1, 2, 19, 20))
+    application.update(
+        age=rnd.choice((18, main.PENSION_AGES[sex] - repayment_period, main.PENSION_AGES[sex] - repayment_period + 1)),
+        requested_sum=requested_sum, repayment_period=repayment_period,
+        last_year_income=rnd.choice((3 * requested_sum / repayment_period, 2 * requested_sum / repayment_period,
+                                     round(rnd.uniform(0, 10), 2))))
+    return application
+
+
+WORKLOADS = {'mixed': _mixed_application, 'edge': _edge_application}
+
+
+def generate_applications(count: int, seed: int = DEFAULT_SEED, workload: str = 'mixed') -> list:
+    """Возвращает воспроизводимый набор заявок"""
+
+    rnd = Random(seed)
+    return [WORKLOADS[workload](rnd) for _ in range(count)]
+
+
+def _measure(run: Callable[[], None], calls: int, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        run()
+        timings.append(time.perf_counter_ns() - started)
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    ns_per_call = min(timings) / calls
+    return {'calls': calls, 'ns_per_call': ns_per_call, 'calls_per_sec': 1e9 / ns_per_call, 'peak_kib': peak / 1024}
+
+
+def _peak_bytes_per_call(call: Callable[[dict], object], applications: list) -> float:
+    """Средняя пиковая временная память одного вызова"""
+
+    peaks = 0
+    tracemalloc.start()
+    try:
+        for application in applications[:_MEMORY_SAMPLE]:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call(application)
+            peaks += tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    return peaks / min(len(applications), _MEMORY_SAMPLE)
+
+
+def bench_scalar(applications: list, verbose: bool = False, repeat: int = 3, engine: str = 'decimal') -> dict:
+    """Замеряет credit_decision по одной заявке, при verbose печать уходит в os.devnull"""
+
+    def _call(application):
+        main.credit_decision(**application, engine=engine)
+
+    def _run():
+        for application in applications:
+            main.credit_decision(**application, engine=engine)
+
+    previous_verbose = main.VERBOSE
+    main.VERBOSE = verbose
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            result = _measure(_run, len(applications), repeat)
+            result['peak_bytes_per_call'] = _peak_bytes_per_call(_call, applications)
+    finally:
+        main.VERBOSE = previous_verbose
+
+    return result
+
+
+def bench_batch(applications: list, repeat: int = 3) -> dict:
+    """Замеряет batch.credit_decision_batch на всех заявках сразу"""
+
+    import numpy as np
+    from batch import credit_decision_batch
+
+    columns = {field: np.array([application[field] for application in applications])
+               for field in main.APPLICATION_FIELDS}
+    return _measure(lambda: credit_decision_batch(**columns), len(applications), repeat)
+
+
+def bench_startup(mode: str, application: dict, repeat: int = 3) -> dict:
+    """Замеряет в новых процессах время импорта и первого вызова режима STARTUP_MODES[mode], берётся лучший
+    из repeat запусков. Пиковый размер процесса - ru_maxrss (в КиБ на Linux)"""
+
+    import_statement, call = STARTUP_MODES[mode]
+    script = _STARTUP_SCRIPT.format(application=application, import_statement=import_statement, call=call)
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, check=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        runs.append(json.loads(output))
+
+    import_ns, first_call_ns, peak_kib = min(runs, key=sum)
+    ns_per_call = import_ns + first_call_ns
+    return {'calls': 1, 'import_ns': import_ns, 'first_call_ns': first_call_ns, 'ns_per_call': ns_per_call,
+            'calls_per_sec': 1e9 / ns_per_call, 'peak_kib': peak_kib}
+
+
+def run_benchmarks(count: int = DEFAULT_COUNT, seed: int = DEFAULT_SEED, repeat: int = 3) -> dict:
+    """Прогоняет все режимы на всех видах нагрузки и замеры холодного старта. Пакетный режим пропускается без numpy"""
+
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    benchmarks = {}
+    for workload in WORKLOADS:
+        applications = generate_applications(count, seed, workload)
+        benchmarks[f'scalar/{workload}'] = bench_scalar(applications, False, repeat)
+        benchmarks[f'scalar_verbose/{workload}'] = bench_scalar(applications, True, repeat)
+        benchmarks[f'scalar_float/{workload}'] = bench_scalar(applications, False, repeat, 'float')
+        if numpy is not None:
+            benchmarks[f'batch/{workload}'] = bench_batch(applications, repeat)
+
+    application = generate_applications(1, seed)[0]
+    for mode in STARTUP_MODES:
+        benchmarks[f'startup/{mode}'] = bench_startup(mode, application, repeat)
+
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'count': count, 'seed': seed,
+            'benchmarks': benchmarks}
+
+
+def compare(results: dict, baseline: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Возвращает режимы, в которых ns_per_call вырос больше чем на долю threshold относительно baseline"""
+
+    regressions = []
+    for name, result in results['benchmarks'].items():
+        reference = baseline['benchmarks'].get(name)
+        if reference is None:
+            continue
+        slowdown = result['ns_per_call'] / reference['ns_per_call'] - 1
+        if slowdown > threshold:
+            regressions.append({'benchmark': name, 'baseline_ns': reference['ns_per_call'],
+                                'ns': result['ns_per_call'], 'slowdown': slowdown})
+
+    return regressions
+
+
+def _print_results(results: dict):
+    print(f"{'benchmark':<24}{'calls/s':>14}{'ns/call':>12}{'peak KiB':>12}{'B/call':>10}")
+    for name, result in results['benchmarks'].items():
+        bytes_per_call = result.get('peak_bytes_per_call')
+        print(f"{name:<24}{result['calls_per_sec']:>14,.0f}{result['ns_per_call']:>12,.0f}{result['peak_kib']:>12,.1f}"
+              f"{'' if bytes_per_call is None else f'{bytes_per_call:,.0f}':>10}")
+
+
+def cli(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description='Бенчмарки credit_decision')
+    parser.add_argument('--count', type=int, default=DEFAULT_COUNT)
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', help='сохранить результаты в JSON')
+    parser.add_argument('--compare', help='сравнить с результатами из JSON')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.count, args.seed, args.repeat)
+    _print_results(results)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"Замедление {regression['benchmark']}: {regression['baseline_ns']:,.0f} -> "
+                  f"{regression['ns']:,.0f} нс/вызов (+{regression['slowdown']:.0%})")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
@@ -0,0 +1,126 @@
+"""Инкрементальный пересчёт портфеля при изменении правил.
+
+IncrementalScorer хранит по каждой заявке входные данные в Decimal, сумму на срок, слагаемое модификатора
+от запрошенной суммы и последнее решение. При переходе на новый набор правил (rules.RuleSet) пересчитываются
+только зависящие от изменившихся параметров части:
+  * модификатор или ограничение суммы для (цель, рейтинг, источник дохода) - сумма, модификатор и платёж
+    заявок только с этим сочетанием;
+  * базовая ставка или множитель модификатора по сумме - платёж всех заявок (слагаемое от суммы не пересчитывается);
+  * пенсионный возраст - только маска причин отказа заявок этого пола (сумма и платёж не пересчитываются).
+Платёж и причины отказа считаются теми же main._annual_payment и main._denial_mask, что и в main.evaluate.
+
+Результат совпадает с полным расчётом rules.compile_rule_set(rule_set) по каждой заявке.
+
+    scorer = IncrementalScorer(applications)
+    for change in scorer.update(rules.load_rule_set('promo.json')):
+        print(change.index, change.before.verdict, '->', change.after.verdict)"""
+from decimal import Decimal
+from math import log10
+from typing import Iterable, List, NamedTuple, Optional
+
+import main
+import rules
+
+
+class DecisionChange(NamedTuple):
+    """Изменившееся решение по заявке с номером index"""
+
+    index: int
+    before: main.Decision
+    after: main.Decision
+
+
+class IncrementalScorer:
+    """Решения по портфелю заявок-словарей с инкрементальным пересчётом при смене правил (см. описание модуля)"""
+
+    def __init__(self, applications: Iterable[dict], rule_set: Optional[rules.RuleSet] = None):
+        self.rule_set = rule_set or rules.default_rule_set()
+        self._rule_table = rules._rule_table(self.rule_set)
+        self._rows_by_key = {}
+        self._rows_by_sex = {}
+        self._rows = []
+        self.recomputed_rows = 0
+
+        for index, application in enumerate(applications):
+            arguments = [application[field] for field in main.APPLICATION_FIELDS]
+            main._check_inputs(*arguments)
+            age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim = arguments
+            key = aim, credit_rating, income_source
+            self._rows_by_key.setdefault(key, []).append(index)
+            self._rows_by_sex.setdefault(sex, []).append(index)
+
+            requested_sum_decimal, repayment_period = Decimal(str(requested_sum)), Decimal(str(repayment_period))
+            self._rows.append((key, sex, age, income_source, last_year_income, credit_rating, requested_sum_decimal,
+                               repayment_period, requested_sum_decimal / repayment_period,
+                               Decimal(str(-log10(requested_sum)))))
+
+        self._decisions = [self._score_payment(index) for index in range(len(self._rows))]
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def decision(self, index: int) -> main.Decision:
+        return self._decisions[index]
+
+    def decisions(self) -> List[main.Decision]:
+        return list(self._decisions)
+
+    def _denial_mask(self, index: int, credit_sum: Decimal, annual_payment: float) -> int:
+        """Маска причин отказа по main._denial_mask с сохранёнными разрешённой суммой и платежом"""
+
+        (_, sex, age, income_source, last_year_income, credit_rating, requested_sum, repayment_period,
+         sum_by_period, _) = self._rows[index]
+        return main._denial_mask(age, income_source, last_year_income, credit_rating, requested_sum,
+                                 repayment_period, self.rule_set.pension_ages[sex], credit_sum, sum_by_period,
+                                 annual_payment)
+
+    def _score_payment(self, index: int) -> main.Decision:
+        """Пересчитывает разрешённую сумму, модификатор, платёж и причины отказа"""
+
+        key, _, _, _, _, _, requested_sum, repayment_period, _, sum_term = self._rows[index]
+        categorical_modifier, credit_sum_cap = self._rule_table[key]
+        credit_sum = requested_sum if credit_sum_cap is None or requested_sum <= credit_sum_cap else credit_sum_cap
+        interest_rate_modifier = categorical_modifier + sum_term * self.rule_set.sum_modifier_factor
+        annual_payment = main._annual_payment(credit_sum, repayment_period,
+                                              self.rule_set.basic_interest_rate + interest_rate_modifier)
+        annual_payment = float(annual_payment.quantize(main._PAYMENT_QUANTUM))
+        denial_mask = self._denial_mask(index, credit_sum, annual_payment)
+
+        return main.Decision(not denial_mask, annual_payment, credit_sum, interest_rate_modifier, denial_mask)
+
+    def update(self, rule_set: rules.RuleSet, flipped_only: bool = True) -> List[DecisionChange]:
+        """Переходит на набор правил rule_set, пересчитывая только затронутые заявки.
+        Возвращает изменения решений по возрастанию номера заявки: при flipped_only - только сменившие вердикт,
+        иначе - все, у которых изменился платёж или маска причин отказа"""
+
+        previous = self.rule_set
+        rule_table = rules._rule_table(rule_set)
+        self.rule_set = rule_set
+
+        if (rule_set.basic_interest_rate != previous.basic_interest_rate
+                or rule_set.sum_modifier_factor != previous.sum_modifier_factor):
+            payment_rows = set(range(len(self._rows)))
+        else:
+            payment_rows = {index for key, rule in rule_table.items() if self._rule_table[key] != rule
+                            for index in self._rows_by_key.get(key, ())}
+        pension_rows = {index for sex, pension_age in rule_set.pension_ages.items()
+                        if previous.pension_ages[sex] != pension_age for index in self._rows_by_sex.get(sex, ())}
+        self._rule_table = rule_table
+
+        changes = []
+        for index in sorted(payment_rows | pension_rows):
+            before = self._decisions[index]
+            if index in payment_rows:
+                after = self._score_payment(index)
+            else:
+                # сменился только пенсионный возраст: сумма и платёж остаются прежними
+                denial_mask = self._denial_mask(index, before.allowed_sum, before.annual_payment)
+                after = before._replace(verdict=not denial_mask, denial_mask=denial_mask)
+
+            self._decisions[index] = after
+            if before.verdict != after.verdict or not flipped_only and (
+                    before.annual_payment != after.annual_payment or before.denial_mask != after.denial_mask):
+                changes.append(DecisionChange(index, before, after))
+
+        self.recomputed_rows = len(payment_rows | pension_rows)
+        return changes
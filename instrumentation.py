@@ -0,0 +1,154 @@
+"""Необязательные метрики расчёта решений по кредиту.
+
+Пока сборщик не включён, main.INSTRUMENTATION равен None и горячий путь проверяет только это значение.
+После enable() собираются:
+  * время и число вызовов по этапам: validation - проверка входных данных, credit_sum, interest_rate_modifier,
+    annual_payment, quantization, denial_checks - шаги Decimal-расчёта, evaluate_<движок> - расчёт целиком,
+    printing - печать при VERBOSE;
+  * число решений, одобрений и частота каждой причины отказа;
+  * события, например float_fallbacks - пересчёты движка float через Decimal у границ;
+  * попадания и промахи подключённых через track_cache кэшей DecisionCache.
+
+Метрики собираются в процессе, где включены, рабочие процессы decide_applications_parallel их не передают.
+
+    metrics = instrumentation.enable()
+    credit_decision(...)
+    metrics.as_dict()        # или metrics.to_prometheus()
+    instrumentation.disable()"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import main
+
+# Имена причин отказа для экспорта: REASON_PENSION_AGE -> pension_age
+REASON_NAMES = {bit: name[len('REASON_'):].lower() for name, bit in vars(main).items() if name.startswith('REASON_')}
+
+
+class Instrumentation:
+    """Потокобезопасный сборщик метрик, см. описание модуля"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches = {}
+        self.reset()
+
+    def reset(self):
+        """Обнуляет собранные метрики, подключённые кэши остаются"""
+
+        with self._lock:
+            self._stage_calls = defaultdict(int)
+            self._stage_ns = defaultdict(int)
+            self._counters = defaultdict(int)
+            self._decisions = 0
+            self._approved = 0
+            self._denial_reasons = dict.fromkeys(REASON_NAMES, 0)
+
+    def record_stages(self, **elapsed_ns: int):
+        """Добавляет время этапов в наносекундах"""
+
+        with self._lock:
+            for stage, elapsed in elapsed_ns.items():
+                self._stage_calls[stage] += 1
+                self._stage_ns[stage] += elapsed
+
+    def count(self, event: str, value: int = 1):
+        """Увеличивает счётчик события"""
+
+        with self._lock:
+            self._counters[event] += value
+
+    def record_decision(self, denial_mask: int):
+        """Учитывает решение по его маске причин отказа"""
+
+        with self._lock:
+            self._decisions += 1
+            if not denial_mask:
+                self._approved += 1
+                return
+            for bit in self._denial_reasons:
+                if denial_mask & bit:
+                    self._denial_reasons[bit] += 1
+
+    def track_cache(self, name: str, cache: main.DecisionCache):
+        """Подключает кэш: его статистика попадает в экспорт под именем name"""
+
+        with self._lock:
+            self._caches[name] = cache
+
+    def as_dict(self) -> dict:
+        """Возвращает снимок метрик, время этапов в наносекундах"""
+
+        with self._lock:
+            stages = {stage: {'calls': calls, 'total_ns': self._stage_ns[stage],
+                              'mean_ns': self._stage_ns[stage] / calls}
+                      for stage, calls in self._stage_calls.items()}
+            snapshot = {'stages': stages, 'counters': dict(self._counters),
+                        'decisions': {'total': self._decisions, 'approved': self._approved,
+                                      'denied': self._decisions - self._approved},
+                        'denial_reasons': {REASON_NAMES[bit]: count for bit, count in self._denial_reasons.items()}}
+            caches = dict(self._caches)
+
+        snapshot['caches'] = {}
+        for name, cache in caches.items():
+            stats = cache.stats()
+            lookups = stats['hits'] + stats['misses']
+            snapshot['caches'][name] = dict(stats, hit_rate=stats['hits'] / lookups if lookups else None)
+        return snapshot
+
+    def to_prometheus(self, prefix: str = 'credit') -> str:
+        """Возвращает метрики в текстовом формате Prometheus"""
+
+        snapshot = self.as_dict()
+        lines = []
+
+        def _metric(name, kind, description, samples):
+            lines.append(f'# HELP {prefix}_{name} {description}')
+            lines.append(f'# TYPE {prefix}_{name} {kind}')
+            for labels, value in samples:
+                label_text = ','.join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                lines.append(f'{prefix}_{name}{{{label_text}}} {value}' if labels else f'{prefix}_{name} {value}')
+
+        stages = snapshot['stages']
+        _metric('stage_seconds_total', 'counter', 'Time spent per scoring stage.',
+                [({'stage': stage}, stats['total_ns'] / 1e9) for stage, stats in stages.items()])
+        _metric('stage_calls_total', 'counter', 'Calls per scoring stage.',
+                [({'stage': stage}, stats['calls']) for stage, stats in stages.items()])
+        _metric('decisions_total', 'counter', 'Credit decisions by verdict.',
+                [({'verdict': verdict}, snapshot['decisions'][verdict]) for verdict in ('approved', 'denied')])
+        _metric('denial_reasons_total', 'counter', 'Denials by reason.',
+                [({'reason': reason}, count) for reason, count in snapshot['denial_reasons'].items()])
+        _metric('events_total', 'counter', 'Scoring events.',
+                [({'event': event}, count) for event, count in snapshot['counters'].items()])
+        caches = snapshot['caches']
+        for field in ('hits', 'misses', 'evictions'):
+            _metric(f'cache_{field}_total', 'counter', f'Decision cache {field}.',
+                    [({'cache': name}, stats[field]) for name, stats in caches.items()])
+        _metric('cache_size', 'gauge', 'Decision cache entries.',
+                [({'cache': name}, stats['size']) for name, stats in caches.items()])
+        return '\n'.join(lines) + '\n'
+
+
+def enable(instrumentation: Optional[Instrumentation] = None) -> Instrumentation:
+    """Включает сбор метрик и возвращает сборщик (новый, если не передан)"""
+
+    main.INSTRUMENTATION = instrumentation or Instrumentation()
+    return main.INSTRUMENTATION
+
+
+def disable():
+    """Выключает сбор метрик"""
+
+    main.INSTRUMENTATION = None
+
+
+@contextmanager
+def instrumented(instrumentation: Optional[Instrumentation] = None) -> Iterator[Instrumentation]:
+    """Собирает метрики внутри блока with, затем возвращает прежний сборщик"""
+
+    previous = main.INSTRUMENTATION
+    try:
+        yield enable(instrumentation)
+    finally:
+        main.INSTRUMENTATION = previous
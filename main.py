@@ -1,166 +1,755 @@
-from math import log10
+import os
+import sys
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from math import floor, log10
 from decimal import *
-from typing import Tuple, Optional
+from time import perf_counter_ns
+from typing import Iterable, Iterator, NamedTuple, TextIO, Tuple, Optional, Union
 
 BASIC_INTEREST_RATE = Decimal('0.1')
 VERBOSE = True
+# Сборщик метрик instrumentation.Instrumentation, при None метрики не собираются (см. instrumentation.enable)
+INSTRUMENTATION = None
+
+# Причины отказа в виде битовой маски, порядок совпадает с порядком проверок в get_denial_mask
+REASON_SUM_OVER_ALLOWED = 1
+REASON_PENSION_AGE = 2
+REASON_INCOME_RATIO = 4
+REASON_CREDIT_RATING = 8
+REASON_NO_INCOME = 16
+REASON_PAYMENT_OVER_HALF_INCOME = 32
+
+DENIAL_REASONS = {
+    REASON_SUM_OVER_ALLOWED: 'Запрошенная сумма больше возможной к выдаче',
+    REASON_PENSION_AGE: 'Возраст на момент окончания кредита превышает пенсионный',
+    REASON_INCOME_RATIO: 'Коэффициент запрошенной суммы на срок погашения больше трети дохода за последний год',
+    REASON_CREDIT_RATING: 'Недостаточный кредитный рейтинг',
+    REASON_NO_INCOME: 'Нет источника постоянного дохода',
+    REASON_PAYMENT_OVER_HALF_INCOME: 'Ежегодный платёж больше половины годового дохода',
+}
+
+PENSION_AGES = {'F': 55, 'M': 60}
+
+# Модификаторы ставки и ограничения суммы кредита (млн) по категориальным входным данным, None - без ограничения
+AIM_MODIFIERS = {
+    'ипотека': Decimal('-0.02'),
+    'развитие бизнеса': Decimal('-0.005'),
+    'автокредит': Decimal('0'),
+    'потребительский': Decimal('0.015'),
+}
+CREDIT_RATING_MODIFIERS = {-2: Decimal('0'), -1: Decimal('0.015'), 0: Decimal('0'),
+                           1: Decimal('-0.0025'), 2: Decimal('-0.0075')}
+INCOME_SOURCE_MODIFIERS = {
+    'пассивный доход': Decimal('0.005'),
+    'наёмный работник': Decimal('-0.0025'),
+    'собственный бизнес': Decimal('0.0025'),
+    'безработный': Decimal('0'),
+}
+CREDIT_RATING_CAPS = {-2: None, -1: 1, 0: 5, 1: 10, 2: 10}
+INCOME_SOURCE_CAPS = {'пассивный доход': 1, 'наёмный работник': 5, 'собственный бизнес': 10, 'безработный': None}
+
+APPLICATION_FIELDS = ('age', 'sex', 'income_source', 'last_year_income',
+                      'credit_rating', 'requested_sum', 'repayment_period', 'aim')
+DECISION_FIELDS = ('index', 'verdict', 'annual_payment', 'reasons', 'error')
+STREAM_CHUNK_SIZE = 1000
+_NUMERIC_FIELDS = frozenset(('age', 'last_year_income', 'credit_rating', 'requested_sum', 'repayment_period'))
+
+# Допустимые значения входных данных. Среди float нет значений между Decimal('0.1') и 0.1,
+# поэтому проверка суммы во float даёт тот же результат, что и с Decimal
+SEXES = frozenset(PENSION_AGES)
+INCOME_SOURCES = frozenset(INCOME_SOURCE_MODIFIERS)
+CREDIT_RATINGS = frozenset(CREDIT_RATING_MODIFIERS)
+AIMS = frozenset(AIM_MODIFIERS)
+MIN_AGE = 18
+MIN_REQUESTED_SUM, MAX_REQUESTED_SUM = 0.1, 10
+MIN_REPAYMENT_PERIOD, MAX_REPAYMENT_PERIOD = 1, 20
+_NUMBER_TYPES = frozenset((float, int))
+
+_SUM_MODIFIER_FACTOR = Decimal('0.01')
+_PAYMENT_QUANTUM = Decimal('1.00000000')
+
+# Допуски, внутри которых расчёт во float не гарантирует совпадения с Decimal и используется Decimal:
+# близость платежа к середине между значениями с 8 знаками и относительная близость суммы на срок к трети дохода
+_FLOAT_ROUNDING_TOLERANCE = 1e-4
+_FLOAT_RATIO_TOLERANCE = 1e-12
+
+
+def _build_rule_table(aim_modifiers: Optional[dict] = None, credit_rating_modifiers: Optional[dict] = None,
+                      income_source_modifiers: Optional[dict] = None, credit_rating_caps: Optional[dict] = None,
+                      income_source_caps: Optional[dict] = None) -> dict:
+    """Строит таблицу правил: (цель, кредитный рейтинг, источник дохода) ->
+    (суммарный модификатор ставки без учёта запрошенной суммы, ограничение суммы кредита или None).
+    Не заданные модификаторы и ограничения берутся из текущих AIM_MODIFIERS, ..., INCOME_SOURCE_CAPS"""
+
+    aim_modifiers = AIM_MODIFIERS if aim_modifiers is None else aim_modifiers
+    credit_rating_modifiers = CREDIT_RATING_MODIFIERS if credit_rating_modifiers is None else credit_rating_modifiers
+    income_source_modifiers = INCOME_SOURCE_MODIFIERS if income_source_modifiers is None else income_source_modifiers
+    credit_rating_caps = CREDIT_RATING_CAPS if credit_rating_caps is None else credit_rating_caps
+    income_source_caps = INCOME_SOURCE_CAPS if income_source_caps is None else income_source_caps
+
+    rule_table = {}
+    for aim, aim_modifier in aim_modifiers.items():
+        for credit_rating, credit_rating_modifier in credit_rating_modifiers.items():
+            for income_source, income_source_modifier in income_source_modifiers.items():
+                caps = [cap for cap in (credit_rating_caps[credit_rating], income_source_caps[income_source])
+                        if cap is not None]
+                rule_table[aim, credit_rating, income_source] = (
+                    aim_modifier + credit_rating_modifier + income_source_modifier,
+                    Decimal(min(caps)) if caps else None)
+
+    return rule_table
+
+
+def _build_float_rule_table(rule_table: dict) -> dict:
+    """Переводит таблицу правил во float для движка float"""
+
+    return {key: (float(modifier), None if cap is None else float(cap)) for key, (modifier, cap) in rule_table.items()}
+
+
+_RULE_TABLE = _build_rule_table()
+_FLOAT_RULE_TABLE = _build_float_rule_table(_RULE_TABLE)
+_FLOAT_SUM_MODIFIER_FACTOR = float(_SUM_MODIFIER_FACTOR)
+
+
+def rebuild_rule_table():
+    """Перестраивает таблицу правил после изменения модификаторов, ограничений суммы
+    или множителя модификатора по сумме"""
+
+    global _RULE_TABLE, _FLOAT_RULE_TABLE, _FLOAT_SUM_MODIFIER_FACTOR
+    _RULE_TABLE = _build_rule_table()
+    _FLOAT_RULE_TABLE = _build_float_rule_table(_RULE_TABLE)
+    _FLOAT_SUM_MODIFIER_FACTOR = float(_SUM_MODIFIER_FACTOR)
+
+
+def get_denial_reasons(denial_mask: int) -> list:
+    """Возвращает список текстовых причин отказа по битовой маске"""
+
+    return [reason for bit, reason in DENIAL_REASONS.items() if denial_mask & bit]
+
+
+class Decision(NamedTuple):
+    """Решение по кредиту.
+    Годовой платёж рассчитывается и при отказе, разрешённая сумма и модификатор ставки хранятся в Decimal
+    (в движке float - во float)"""
+
+    verdict: bool
+    annual_payment: float
+    allowed_sum: Union[Decimal, float]
+    rate_modifier: Union[Decimal, float]
+    denial_mask: int
+
+    @property
+    def reasons(self) -> list:
+        """Текстовые причины отказа"""
+
+        return get_denial_reasons(self.denial_mask)
+
+    def as_tuple(self) -> Tuple[bool, Optional[float]]:
+        """Возвращает решение в формате credit_decision"""
+
+        return self.verdict, self.annual_payment if self.verdict else None
+
+
+def _denial_mask(age: int, income_source: str, last_year_income: float, credit_rating: int, requested_sum,
+                 repayment_period, pension_age: int, allowed_credit_sum, sum_by_period, annual_payment: float) -> int:
+    """Возвращает битовую маску причин отказа, 0 - кредит выдаётся.
+    Одна проверка для всех расчётов: числа могут быть Decimal или float, sum_by_period - запрошенная сумма на срок.
+    Для определения точного пенсионного возраста на момент выплаты кредита нужно знать хотя бы полугодие рождения
+    https://pfr.gov.ru/grazhdanam/zakon/"""
 
+    denial_mask = 0
+    if requested_sum > allowed_credit_sum:
+        denial_mask |= REASON_SUM_OVER_ALLOWED
+    if repayment_period > pension_age - age:
+        denial_mask |= REASON_PENSION_AGE
+    if sum_by_period > last_year_income / 3:
+        denial_mask |= REASON_INCOME_RATIO
+    if credit_rating == -2:
+        denial_mask |= REASON_CREDIT_RATING
+    if income_source == 'безработный':
+        denial_mask |= REASON_NO_INCOME
+    if annual_payment > last_year_income / 2:
+        denial_mask |= REASON_PAYMENT_OVER_HALF_INCOME
+    return denial_mask
+
+
+def _annual_payment(allowed_credit_sum: Decimal, repayment_period: Decimal, interest_rate: Decimal) -> Decimal:
+    """Возвращает годовой платёж по кредиту до округления, interest_rate - базовая ставка с модификатором"""
+
+    return allowed_credit_sum * (1 + repayment_period * interest_rate) / repayment_period
+
+
+def _score_decimal(rule_table: dict, pension_ages: dict, interest_rate: Decimal, sum_modifier_factor: Decimal,
+                   age: int, sex: str, income_source: str, last_year_income: float,
+                   credit_rating: int, requested_sum, repayment_period, aim: str) -> Decision:
+    """Принимает решение по проверенным входным данным и правилам: таблице правил, пенсионному возрасту,
+    базовой ставке и множителю модификатора по сумме. Единственная реализация Decimal-расчёта:
+    на ней построены _evaluate и функции наборов правил rules.compile_rule_set"""
+
+    categorical_modifier, credit_sum_cap = rule_table[aim, credit_rating, income_source]
+    instrumentation = INSTRUMENTATION
+    if instrumentation is None:
+        interest_rate_modifier = categorical_modifier + Decimal(str(-log10(requested_sum))) * sum_modifier_factor
+        requested_sum, repayment_period = Decimal(str(requested_sum)), Decimal(str(repayment_period))
+        credit_sum = requested_sum if credit_sum_cap is None or requested_sum <= credit_sum_cap else credit_sum_cap
+        annual_payment = _annual_payment(credit_sum, repayment_period, interest_rate + interest_rate_modifier)
+        annual_payment = float(annual_payment.quantize(_PAYMENT_QUANTUM))
+        denial_mask = _denial_mask(age, income_source, last_year_income, credit_rating, requested_sum,
+                                   repayment_period, pension_ages[sex], credit_sum,
+                                   requested_sum / repayment_period, annual_payment)
+    else:
+        # те же шаги с замером времени каждого
+        requested_sum, repayment_period = Decimal(str(requested_sum)), Decimal(str(repayment_period))
+        started = perf_counter_ns()
+        credit_sum = requested_sum if credit_sum_cap is None or requested_sum <= credit_sum_cap else credit_sum_cap
+        credit_sum_done = perf_counter_ns()
+        interest_rate_modifier = categorical_modifier + Decimal(str(-log10(requested_sum))) * sum_modifier_factor
+        modifier_done = perf_counter_ns()
+        annual_payment = _annual_payment(credit_sum, repayment_period, interest_rate + interest_rate_modifier)
+        payment_done = perf_counter_ns()
+        annual_payment = float(annual_payment.quantize(_PAYMENT_QUANTUM))
+        quantization_done = perf_counter_ns()
+        denial_mask = _denial_mask(age, income_source, last_year_income, credit_rating, requested_sum,
+                                   repayment_period, pension_ages[sex], credit_sum,
+                                   requested_sum / repayment_period, annual_payment)
+        instrumentation.record_stages(credit_sum=credit_sum_done - started,
+                                      interest_rate_modifier=modifier_done - credit_sum_done,
+                                      annual_payment=payment_done - modifier_done,
+                                      quantization=quantization_done - payment_done,
+                                      denial_checks=perf_counter_ns() - quantization_done)
+
+    return Decision(not denial_mask, annual_payment, credit_sum, interest_rate_modifier, denial_mask)
+
+
+def _evaluate(age: int, sex: str, income_source: str, last_year_income: float,
+              credit_rating: int, requested_sum, repayment_period, aim: str) -> Decision:
+    """Принимает решение по проверенным входным данным и текущим правилам main.
+    Ничего не печатает, поэтому используется и в credit_decision, и в пакетных расчётах"""
+
+    return _score_decimal(_RULE_TABLE, PENSION_AGES, BASIC_INTEREST_RATE, _SUM_MODIFIER_FACTOR, age, sex,
+                          income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim)
+
+
+def _check_inputs(age: int, sex: str, income_source: str, last_year_income: float,
+                  credit_rating: int, requested_sum, repayment_period, aim: str):
+    """Проверки входных данных.
+    Через assert для наглядности, но можно разделить на TypeError и прочие"""
+    assert None not in (age, sex, income_source, last_year_income,
+                        credit_rating, requested_sum, repayment_period, aim), 'не заданы входные данные'
+
+    assert type(age) is int, 'age: ожидается int'
+    assert age >= MIN_AGE, 'age: меньше 18'
+
+    assert type(sex) is str and sex in SEXES, 'sex: недопустимое значение'
+
+    assert type(income_source) is str and income_source in INCOME_SOURCES, 'income_source: недопустимое значение'
+
+    assert type(last_year_income) in _NUMBER_TYPES, 'last_year_income: ожидается int или float'
+
+    assert type(credit_rating) is int and credit_rating in CREDIT_RATINGS, 'credit_rating: недопустимое значение'
+
+    assert type(requested_sum) in _NUMBER_TYPES, 'requested_sum: ожидается int или float'
+    assert MIN_REQUESTED_SUM <= requested_sum <= MAX_REQUESTED_SUM, 'requested_sum: вне диапазона 0.1..10'
+
+    assert type(repayment_period) in _NUMBER_TYPES, 'repayment_period: ожидается int или float'
+    assert MIN_REPAYMENT_PERIOD <= repayment_period <= MAX_REPAYMENT_PERIOD, 'repayment_period: вне диапазона 1..20'
+
+    assert type(aim) is str and aim in AIMS, 'aim: недопустимое значение'
+
+
+def _score_float(rule_table: dict, float_rule_table: dict, pension_ages: dict, interest_rate: Decimal,
+                 sum_modifier_factor: Decimal, float_sum_modifier_factor: float, age: int, sex: str,
+                 income_source: str, last_year_income: float, credit_rating: int, requested_sum, repayment_period,
+                 aim: str) -> Decision:
+    """Вариант _score_decimal на float, float_rule_table и float_sum_modifier_factor - rule_table
+    и sum_modifier_factor во float (см. _build_float_rule_table).
+    Годовой платёж до округления отличается от Decimal-расчёта не больше чем на 1e-13, поэтому после округления
+    до 8 знаков он совпадает, если точное значение дальше _FLOAT_ROUNDING_TOLERANCE * 1e-8 от середины между
+    соседними значениями с 8 знаками. Так же и с порогом трети дохода. Остальные проверки точны.
+    Заявки у этих границ (в основном точные совпадения с порогом, например сумма 0.8 на 3 года при доходе 0.8)
+    пересчитываются через _score_decimal, поэтому платёж и решение всегда совпадают с ним"""
+
+    categorical_modifier, credit_sum_cap = float_rule_table[aim, credit_rating, income_source]
+    credit_sum = requested_sum if credit_sum_cap is None or requested_sum <= credit_sum_cap else credit_sum_cap
+    interest_rate_modifier = categorical_modifier - log10(requested_sum) * float_sum_modifier_factor
+    scaled_payment = (credit_sum * (1 + repayment_period * (float(interest_rate) + interest_rate_modifier))
+                      / repayment_period * 1e8)
+    sum_by_period = requested_sum / repayment_period
+
+    if (abs(scaled_payment - floor(scaled_payment) - 0.5) < _FLOAT_ROUNDING_TOLERANCE
+            or abs(sum_by_period - last_year_income / 3) <= _FLOAT_RATIO_TOLERANCE * sum_by_period):
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.count('float_fallbacks')
+        exact_decision = _score_decimal(rule_table, pension_ages, interest_rate, sum_modifier_factor, age, sex,
+                                        income_source, last_year_income, credit_rating, requested_sum,
+                                        repayment_period, aim)
+        return exact_decision._replace(allowed_sum=credit_sum, rate_modifier=interest_rate_modifier)
+
+    annual_payment = round(scaled_payment) / 1e8
+    denial_mask = _denial_mask(age, income_source, last_year_income, credit_rating, requested_sum, repayment_period,
+                               pension_ages[sex], credit_sum, sum_by_period, annual_payment)
+
+    return Decision(not denial_mask, annual_payment, credit_sum, interest_rate_modifier, denial_mask)
+
+
+def _evaluate_float(age: int, sex: str, income_source: str, last_year_income: float,
+                    credit_rating: int, requested_sum, repayment_period, aim: str) -> Decision:
+    """Вариант _evaluate на float с тем же результатом (см. _score_float)"""
+
+    return _score_float(_RULE_TABLE, _FLOAT_RULE_TABLE, PENSION_AGES, BASIC_INTEREST_RATE, _SUM_MODIFIER_FACTOR,
+                        _FLOAT_SUM_MODIFIER_FACTOR, age, sex, income_source, last_year_income, credit_rating,
+                        requested_sum, repayment_period, aim)
+
+
+# Движки расчёта: decimal - эталонный, float - быстрый, с тем же результатом (см. _evaluate_float)
+ENGINES = {'decimal': _evaluate, 'float': _evaluate_float}
+
+
+def evaluate(age: int, sex: str, income_source: str, last_year_income: float,
+             credit_rating: int, requested_sum, repayment_period, aim: str, engine: str = 'decimal',
+             trusted: bool = False) -> Decision:
+    """Проверяет входные данные и возвращает решение по кредиту целиком, ничего не печатая.
+    При trusted=True входные данные считаются уже проверенными и не проверяются"""
+
+    instrumentation = INSTRUMENTATION
+    if instrumentation is not None:
+        return _evaluate_instrumented(instrumentation, age, sex, income_source, last_year_income,
+                                      credit_rating, requested_sum, repayment_period, aim, engine, trusted)
+
+    if not trusted:
+        _check_inputs(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim)
+    return ENGINES[engine](age, sex, income_source, last_year_income,
+                           credit_rating, requested_sum, repayment_period, aim)
+
+
+def _evaluate_instrumented(instrumentation, age: int, sex: str, income_source: str, last_year_income: float,
+                           credit_rating: int, requested_sum, repayment_period, aim: str, engine: str,
+                           trusted: bool) -> Decision:
+    """evaluate с замером проверки входных данных и расчёта и учётом решения в instrumentation"""
+
+    started = perf_counter_ns()
+    if not trusted:
+        _check_inputs(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim)
+    validation_done = perf_counter_ns()
+    decision = ENGINES[engine](age, sex, income_source, last_year_income,
+                               credit_rating, requested_sum, repayment_period, aim)
+    instrumentation.record_stages(validation=validation_done - started,
+                                  **{f'evaluate_{engine}': perf_counter_ns() - validation_done})
+    instrumentation.record_decision(decision.denial_mask)
+    return decision
 
-def credit_decision(age: int, sex: str, income_source: str, last_year_income: float,
-                    credit_rating: int, requested_sum, repayment_period, aim: str) -> Tuple[bool, Optional[float]]:
-    def _check_inputs():
-        """Проверки входных данных.
-        Через assert для наглядности, но можно разделить на TypeError и прочие"""
-        assert None not in [age, sex, income_source, last_year_income,
-                            credit_rating, requested_sum, repayment_period, aim]
 
-        assert type(age) == int
-        assert age >= 18
+def _income_ratio_exceeded(requested_sum, repayment_period, last_year_income) -> bool:
+    """Проверка трети дохода с тем же результатом, что в _evaluate: во float, а у самого порога - в Decimal"""
 
-        assert sex in ['F', 'M']
-
-        assert income_source in ['пассивный доход', 'наёмный работник', 'собственный бизнес', 'безработный']
+    sum_by_period = requested_sum / repayment_period
+    third_of_income = last_year_income / 3
+    if abs(sum_by_period - third_of_income) <= _FLOAT_RATIO_TOLERANCE * sum_by_period:
+        return Decimal(str(requested_sum)) / Decimal(str(repayment_period)) > third_of_income
+
+    return sum_by_period > third_of_income
+
+
+def _iter_early_denials(age: int, sex: str, income_source: str, last_year_income: float,
+                        credit_rating: int, requested_sum, repayment_period, aim: str) -> Iterator[int]:
+    """Лениво выдаёт причины отказа, для которых не нужны ставка и платёж, от дешёвых проверок к дорогим"""
+
+    if credit_rating == -2:
+        yield REASON_CREDIT_RATING
+    if income_source == 'безработный':
+        yield REASON_NO_INCOME
+    if repayment_period > PENSION_AGES[sex] - age:
+        yield REASON_PENSION_AGE
+    credit_sum_cap = _RULE_TABLE[aim, credit_rating, income_source][1]
+    if credit_sum_cap is not None and requested_sum > credit_sum_cap:
+        yield REASON_SUM_OVER_ALLOWED
+    if _income_ratio_exceeded(requested_sum, repayment_period, last_year_income):
+        yield REASON_INCOME_RATIO
+
+
+def _quick_decision(age: int, sex: str, income_source: str, last_year_income: float,
+                    credit_rating: int, requested_sum, repayment_period, aim: str,
+                    engine: str = 'decimal') -> Tuple[bool, Optional[float], int]:
+    denial_mask = 0
+    for bit in _iter_early_denials(age, sex, income_source, last_year_income,
+                                   credit_rating, requested_sum, repayment_period, aim):
+        denial_mask |= bit
+    if denial_mask:
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.record_decision(denial_mask)
+        return False, None, denial_mask
 
-        assert type(last_year_income) in (float, int)
-
-        assert credit_rating in [-2, -1, 0, 1, 2]
+    decision = ENGINES[engine](age, sex, income_source, last_year_income,
+                               credit_rating, requested_sum, repayment_period, aim)
+    if INSTRUMENTATION is not None:
+        INSTRUMENTATION.record_decision(decision.denial_mask)
+    return decision.verdict, decision.annual_payment if decision.verdict else None, decision.denial_mask
 
-        assert type(requested_sum) in (float, int)
-        assert Decimal('0.1') <= requested_sum <= 10
 
-        assert type(repayment_period) in (float, int)
-        assert 1 <= repayment_period <= 20
-
-        assert aim in ['ипотека', 'развитие бизнеса', 'автокредит', 'потребительский']
-
-    def _get_pension_age():
-        """Возвращает пенсионный возраст для клиента.
-        Для определения точного пенсионного возраста на момент выплаты кредита нужно знать хотя бы полугодие рождения
-        https://pfr.gov.ru/grazhdanam/zakon/"""
-
-        pension_ages = {'F': 55, 'M': 60}
-        return pension_ages[sex]
-
-    def _get_interest_rate_modifier():
-        """Возвращает модификатор базовой процентной ставки"""
-
-        interest_rate_modifier = Decimal('0')
-
-        if aim == 'ипотека':
-            interest_rate_modifier -= Decimal('0.02')
-        elif aim == 'развитие бизнеса':
-            interest_rate_modifier -= Decimal('0.005')
-        elif aim == 'потребительский':
-            interest_rate_modifier += Decimal('0.015')
-
-        if credit_rating == -1:
-            interest_rate_modifier += Decimal('0.015')
-        elif credit_rating == 0:
-            interest_rate_modifier -= Decimal('0')  # для прозрачности
-        elif credit_rating == 1:
-            interest_rate_modifier -= Decimal('0.0025')
-        elif credit_rating == 2:
-            interest_rate_modifier -= Decimal('0.0075')
-
-        sum_interest_modifier = Decimal(str(-log10(requested_sum))) * Decimal('0.01')
-        interest_rate_modifier += sum_interest_modifier
-
-        if income_source == 'пассивный доход':
-            interest_rate_modifier += Decimal('0.005')
-        elif income_source == 'наёмный работник':
-            interest_rate_modifier -= Decimal('0.0025')
-        elif income_source == 'собственный бизнес':
-            interest_rate_modifier += Decimal('0.0025')
-
-        return interest_rate_modifier
-
-    def _get_credit_sum():
-        """Возвращает разрешенную сумму кредита"""
-
-        available_credit_sum = requested_sum
-
-        if income_source == 'пассивный доход':
-            available_credit_sum = available_credit_sum if available_credit_sum <= 1 else 1
-        elif income_source == 'наёмный работник':
-            available_credit_sum = available_credit_sum if available_credit_sum <= 5 else 5
-        elif income_source == 'собственный бизнес':
-            available_credit_sum = available_credit_sum if available_credit_sum <= 10 else 10
-
-        if credit_rating == -1:
-            available_credit_sum = available_credit_sum if available_credit_sum <= 1 else 1
-        elif credit_rating == 0:
-            available_credit_sum = available_credit_sum if available_credit_sum <= 5 else 5
-        elif credit_rating >= 1:
-            available_credit_sum = available_credit_sum if available_credit_sum <= 10 else 10
-
-        available_credit_sum = Decimal(str(available_credit_sum))
-
-        return available_credit_sum
-
-    def get_annual_payment(allowed_credit_sum, interest_rate, modifier):
-        """Возвращает годовой платёж по кредиту"""
-
-        return allowed_credit_sum * (1 + repayment_period * (interest_rate + modifier)) / repayment_period
-
-    def get_verdict(allowed_credit_sum):
-        """Возвращает решение о выдаче кредита"""
-
-        credit_denial_reasons = {
-            'Запрошенная сумма больше возможной к выдаче':
-                requested_sum > allowed_credit_sum,
-            'Возраст на момент окончания кредита превышает пенсионный':
-                age + repayment_period > _get_pension_age(),
-            'Коэффициент запрошенной суммы на срок погашения больше трети дохода за последний год':
-                requested_sum / repayment_period > last_year_income / 3,
-            'Недостаточный кредитный рейтинг':
-                credit_rating == -2,
-            'Нет источника постоянного дохода':
-                income_source == 'безработный',
-            'Ежегодный платёж больше половины годового дохода':
-                result_annual_payment > last_year_income / 2
-        }
-
-        if VERBOSE:
-            current_denial_reasons = [reason for reason in credit_denial_reasons.keys()
-                                      if credit_denial_reasons[reason]]
-            return (False, current_denial_reasons) if current_denial_reasons else True
-
-        return False if [reason for reason in credit_denial_reasons.keys()
-                         if credit_denial_reasons[reason]] else True
-
-    _check_inputs()
-    requested_sum, repayment_period = Decimal(str(requested_sum)), Decimal(str(repayment_period))
-    credit_sum = _get_credit_sum()
-    current_interest_rate_modifier = _get_interest_rate_modifier()
-    result_annual_payment = get_annual_payment(credit_sum, BASIC_INTEREST_RATE, current_interest_rate_modifier)
-    result_annual_payment = float(result_annual_payment.quantize(Decimal(
-        '1.00000000')))
-    result_verdict = get_verdict(credit_sum)
+def quick_decision(age: int, sex: str, income_source: str, last_year_income: float,
+                   credit_rating: int, requested_sum, repayment_period, aim: str,
+                   engine: str = 'decimal', trusted: bool = False) -> Tuple[bool, Optional[float], int]:
+    """Возвращает решение, годовой платёж (None при отказе) и битовую маску причин отказа.
+    Ставка и платёж рассчитываются, только если пройдены все проверки, которым они не нужны,
+    поэтому у отклонённых раньше заявок в маске нет причины REASON_PAYMENT_OVER_HALF_INCOME"""
+
+    if not trusted:
+        _check_inputs(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim)
+    return _quick_decision(age, sex, income_source, last_year_income,
+                           credit_rating, requested_sum, repayment_period, aim, engine)
+
+
+def is_approved(age: int, sex: str, income_source: str, last_year_income: float,
+                credit_rating: int, requested_sum, repayment_period, aim: str, engine: str = 'decimal',
+                trusted: bool = False) -> bool:
+    """Возвращает только решение: проверки идут от дешёвых к дорогим до первого отказа"""
+
+    if not trusted:
+        _check_inputs(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim)
+    if next(_iter_early_denials(age, sex, income_source, last_year_income,
+                                credit_rating, requested_sum, repayment_period, aim), 0):
+        return False
+
+    return ENGINES[engine](age, sex, income_source, last_year_income,
+                           credit_rating, requested_sum, repayment_period, aim).verdict
+
+
+def format_decision(decision: Decision, application: dict) -> str:
+    """Возвращает текстовое описание заявки и решения по ней"""
+
+    if not decision.verdict:
+        result = f'Кредит не выдаётся: {decision.reasons}'
+
+    else:
+        result = f'Кредит: выдаётся, годовой платёж: {decision.annual_payment * 1000000} р.'
+
+    requester_data = f'''
+Возраст: {application['age']},
+Пол: {application['sex']},
+Источник дохода: {application['income_source']},
+Доход за прошлый год (млн. р.): {application['last_year_income']},
+Кредитный рейтинг: {application['credit_rating']},
+Запрошенная сумма (млн. р.): {application['requested_sum']},
+Срок погашения: {application['repayment_period']} {'г.' if application['repayment_period'] < 5 else 'лет'},
+Цель: {application['aim']}'''
+
+    return f'{requester_data}\n{result}'
+
+
+def credit_decision(age: int, sex: str, income_source: str, last_year_income: float,
+                    credit_rating: int, requested_sum, repayment_period, aim: str,
+                    engine: str = 'decimal', trusted: bool = False) -> Tuple[bool, Optional[float]]:
+    decision = evaluate(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim,
+                        engine, trusted)
 
     if VERBOSE:
+        started = perf_counter_ns()
+        print(format_decision(decision, {'age': age, 'sex': sex, 'income_source': income_source,
+                                         'last_year_income': last_year_income, 'credit_rating': credit_rating,
+                                         'requested_sum': requested_sum, 'repayment_period': repayment_period,
+                                         'aim': aim}))
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.record_stages(printing=perf_counter_ns() - started)
+
+    return decision.as_tuple()
+
+
+# Заявка для warm_up: проходит все проверки и весь расчёт
+_WARM_UP_APPLICATION = {'age': 30, 'sex': 'F', 'income_source': 'наёмный работник', 'last_year_income': 3,
+                        'credit_rating': 1, 'requested_sum': 1.5, 'repayment_period': 5, 'aim': 'автокредит'}
+
+
+def warm_up(engines: Iterable[str] = tuple(ENGINES)):
+    """Готовит расчёт к первому вызову: перестраивает таблицы правил, если они отстали от модификаторов
+    и ограничений суммы, и один раз считает пример заявки каждым движком из engines без печати.
+    Вызывается при старте рабочего процесса, чтобы первая настоящая заявка не платила за подготовку"""
+
+    if _RULE_TABLE != _build_rule_table():
+        rebuild_rule_table()
+    for engine in engines:
+        evaluate(**_WARM_UP_APPLICATION, engine=engine)
+        _quick_decision(**_WARM_UP_APPLICATION, engine=engine)
+
+
+class DecisionCache:
+    """LRU-кэш решений по кредиту, ключ - проверенные входные данные.
+    Вызывается так же, как credit_decision, но ничего не печатает.
+    Кэш сам очищается при изменении BASIC_INTEREST_RATE или перестройке таблицы правил (rebuild_rule_table),
+    а после других изменений правил его нужно очистить через clear()"""
+
+    def __init__(self, maxsize: int = 4096):
+        assert maxsize >= 1, 'maxsize: меньше 1'
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._interest_rate = BASIC_INTEREST_RATE
+        self._rule_table = _RULE_TABLE
+
+    def __call__(self, age: int, sex: str, income_source: str, last_year_income: float,
+                 credit_rating: int, requested_sum, repayment_period, aim: str) -> Tuple[bool, Optional[float]]:
+        _check_inputs(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim)
+        key = (age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim)
+
+        with self._lock:
+            if self._interest_rate != BASIC_INTEREST_RATE or self._rule_table is not _RULE_TABLE:
+                self._clear()
+            result = self._entries.get(key)
+            if result is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return result
+            interest_rate, rule_table = self._interest_rate, self._rule_table
+
+        result = _evaluate(*key).as_tuple()
+
+        with self._lock:
+            self.misses += 1
+            # правила могли смениться во время расчёта: тогда результат не сохраняется,
+            # чтобы в кэше не оказалось решения, посчитанного не по тем правилам, с которыми кэш сверялся
+            if (self._interest_rate != interest_rate or self._rule_table is not rule_table
+                    or BASIC_INTEREST_RATE != interest_rate or _RULE_TABLE is not rule_table):
+                return result
+            self._entries[key] = result
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return result
+
+    def _clear(self):
+        self._entries.clear()
+        self._interest_rate = BASIC_INTEREST_RATE
+        self._rule_table = _RULE_TABLE
+
+    def clear(self):
+        """Очищает кэш, статистика сохраняется"""
+
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        """Возвращает статистику попаданий, промахов и вытеснений"""
+
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+def _parse_number(value):
+    """Переводит значение из CSV в int или float. Некорректное значение возвращается как есть,
+    чтобы ошибку сообщила проверка входных данных"""
+
+    for number_type in (int, float):
+        try:
+            return number_type(value)
+        except (TypeError, ValueError):
+            pass
+
+    return value
+
+
+def read_applications(stream: TextIO, input_format: str = 'jsonl') -> Iterator:
+    """Лениво читает заявки из потока в формате JSONL или CSV.
+    Строки JSONL, которые не удалось разобрать, передаются дальше как исключение,
+    чтобы ошибка попала в решение по этой заявке, а не прерывала обработку"""
+
+    # csv и json, как и argparse и concurrent.futures ниже, импортируются при первом использовании,
+    # чтобы не замедлять импорт main в короткоживущих процессах (см. worker)
+    if input_format == 'csv':
+        import csv
+
+        for row in csv.DictReader(stream):
+            yield {field: _parse_number(value) if field in _NUMERIC_FIELDS else value for field, value in row.items()}
+        return
+
+    import json
+
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as error:
+            yield error
+
+
+def _decide_application(application, engine: str = 'decimal', reasons: str = 'text') -> dict:
+    """Возвращает решение по одной заявке без печати, ошибки входных данных (в том числе арифметические,
+    например доход, который не переводится во float) сохраняются в поле error.
+    При reasons='mask' причины отказа - битовая маска quick_decision"""
+
+    try:
+        if isinstance(application, Exception):
+            raise application
+        arguments = {field: application[field] for field in APPLICATION_FIELDS}
+        _check_inputs(**arguments)
+        if reasons == 'mask':
+            verdict, annual_payment, denial_mask = _quick_decision(**arguments, engine=engine)
+            return {'verdict': verdict, 'annual_payment': annual_payment, 'reasons': denial_mask, 'error': None}
+        decision = ENGINES[engine](**arguments)
+        if INSTRUMENTATION is not None:
+            INSTRUMENTATION.record_decision(decision.denial_mask)
+    except (ArithmeticError, AssertionError, KeyError, TypeError, ValueError) as error:
+        return {'verdict': None, 'annual_payment': None, 'reasons': 0 if reasons == 'mask' else [],
+                'error': f'{type(error).__name__}: {error}'}
+
+    verdict, annual_payment = decision.as_tuple()
+    return {'verdict': verdict, 'annual_payment': annual_payment, 'reasons': decision.reasons, 'error': None}
 
-        if result_verdict is not True:
-            result_verdict, reasons = result_verdict
-            result = f'Кредит не выдаётся: {reasons}'
 
-        else:
-            result = f'Кредит: выдаётся, годовой платёж: {result_annual_payment * 1000000} р.'
+def _decide_chunk(applications: list, engine: str = 'decimal', reasons: str = 'text') -> list:
+    """Возвращает решения по порции заявок"""
+
+    return [_decide_application(application, engine, reasons) for application in applications]
+
+
+def _iter_chunks(applications: Iterable, chunk_size: int) -> Iterator[list]:
+    """Лениво делит поток заявок на порции не больше chunk_size"""
+
+    assert chunk_size >= 1, 'chunk_size: меньше 1'
+    applications = iter(applications)
+    while True:
+        chunk = list(islice(applications, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def decide_applications(applications: Iterable, chunk_size: int = STREAM_CHUNK_SIZE,
+                        engine: str = 'decimal', reasons: str = 'text') -> Iterator[dict]:
+    """Лениво принимает решения по потоку заявок порциями по chunk_size.
+    Каждое решение содержит номер заявки во входном потоке, решение, годовой платёж, причины отказа и ошибку.
+    Причины отказа - список текстов или, при reasons='mask', битовая маска quick_decision"""
+
+    index = 0
+    for chunk in _iter_chunks(applications, chunk_size):
+        for decision in _decide_chunk(chunk, engine, reasons):
+            yield {'index': index, **decision}
+            index += 1
+
+
+def _init_worker(rule_set):
+    """Отключает печать в рабочих процессах, чтобы stdout не становился точкой конкуренции, и делает текущими
+    правила родительского процесса: при запуске через spawn и forkserver процесс начинает с правил по умолчанию"""
 
-        requester_data = f'''
-Возраст: {age},
-Пол: {sex},
-Источник дохода: {income_source},
-Доход за прошлый год (млн. р.): {last_year_income},
-Кредитный рейтинг: {credit_rating},
-Запрошенная сумма (млн. р.): {requested_sum},
-Срок погашения: {repayment_period} {'г.' if repayment_period < 5 else 'лет'},
-Цель: {aim}'''
+    import rules
 
-        print(requester_data, result, sep='\n')
+    global VERBOSE
+    VERBOSE = False
+    rules.apply_rule_set(rule_set)
 
-    return result_verdict, result_annual_payment if result_verdict else None
+
+def decide_applications_parallel(applications: Iterable, chunk_size: int = STREAM_CHUNK_SIZE,
+                                 max_workers: Optional[int] = None, engine: str = 'decimal',
+                                 reasons: str = 'text', mp_context=None) -> Iterator[dict]:
+    """Параллельный вариант decide_applications на пуле процессов.
+    Рабочие процессы получают заявки порциями по chunk_size, решения возвращаются в порядке поступления заявок.
+    В обработке одновременно не больше двух порций на процесс, поэтому память не растёт с размером входа.
+    Процессы считают по текущим правилам (см. rules.apply_rule_set) при любом способе запуска,
+    mp_context - контекст multiprocessing для пула, по умолчанию текущий"""
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    import rules
+
+    max_workers = max_workers or os.cpu_count() or 1
+    index = 0
+
+    with ProcessPoolExecutor(max_workers, mp_context, initializer=_init_worker,
+                             initargs=(rules.default_rule_set(),)) as executor:
+        pending = deque()
+        for chunk in _iter_chunks(applications, chunk_size):
+            pending.append(executor.submit(_decide_chunk, chunk, engine, reasons))
+            while len(pending) >= 2 * max_workers or (pending and pending[0].done()):
+                for decision in pending.popleft().result():
+                    yield {'index': index, **decision}
+                    index += 1
+
+        while pending:
+            for decision in pending.popleft().result():
+                yield {'index': index, **decision}
+                index += 1
+
+
+def write_decisions(decisions: Iterable[dict], stream: TextIO, output_format: str = 'jsonl') -> int:
+    """Пишет решения в поток по мере поступления, возвращает количество записанных решений"""
+
+    count = 0
+    if output_format == 'csv':
+        import csv
+
+        writer = csv.DictWriter(stream, DECISION_FIELDS)
+        writer.writeheader()
+        for count, decision in enumerate(decisions, 1):
+            if isinstance(decision['reasons'], list):
+                decision = {**decision, 'reasons': '; '.join(decision['reasons'])}
+            writer.writerow(decision)
+    else:
+        import json
+
+        for count, decision in enumerate(decisions, 1):
+            stream.write(json.dumps(decision, ensure_ascii=False) + '\n')
+
+    stream.flush()
+    return count
+
+
+def _detect_format(path: Optional[str], default: str = 'jsonl') -> str:
+    return 'csv' if path and path.lower().endswith('.csv') else default
+
+
+def _open_stream(path: str, mode: str, default: TextIO) -> TextIO:
+    return default if path == '-' else open(path, mode, encoding='utf-8', newline='')
+
+
+def cli(argv: Optional[list] = None):
+    """Потоковая обработка заявок из файла или stdin. Без аргументов выводит пример расчёта"""
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Решения по кредитным заявкам из JSONL или CSV')
+    parser.add_argument('input', nargs='?', help="файл с заявками, '-' - stdin")
+    parser.add_argument('-o', '--output', default='-', help="файл для решений, по умолчанию stdout")
+    parser.add_argument('--input-format', choices=('jsonl', 'csv'))
+    parser.add_argument('--output-format', choices=('jsonl', 'csv'))
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument('--engine', choices=tuple(ENGINES), default='decimal', help='движок расчёта')
+    parser.add_argument('--reasons', choices=('text', 'mask'), default='text',
+                        help='причины отказа текстом или битовой маской с ленивыми проверками')
+    parser.add_argument('--workers', type=int, default=1, help='количество процессов, 0 - по числу ядер')
+    parser.add_argument('--rules', help='файл набора правил JSON или TOML (см. rules.py)')
+    args = parser.parse_args(argv)
+
+    if args.rules:
+        import rules
+
+        rules.apply_rule_set(rules.load_rule_set(args.rules))
+
+    if args.input is None:
+        print(credit_decision(age=20, sex='M', income_source='наёмный работник', last_year_income=2.2,
+                              credit_rating=0, requested_sum=0.1, repayment_period=1, aim='ипотека'))
+        return
+
+    input_format = args.input_format or _detect_format(args.input)
+    output_format = args.output_format or _detect_format(args.output, input_format)
+    input_stream = _open_stream(args.input, 'r', sys.stdin)
+    output_stream = _open_stream(args.output, 'w', sys.stdout)
+    try:
+        applications = read_applications(input_stream, input_format)
+        if args.workers == 1:
+            decisions = decide_applications(applications, args.chunk_size, args.engine, args.reasons)
+        else:
+            decisions = decide_applications_parallel(applications, args.chunk_size, args.workers or None,
+                                                     args.engine, args.reasons)
+        write_decisions(decisions, output_stream, output_format)
+    finally:
+        for stream in (input_stream, output_stream):
+            if stream not in (sys.stdin, sys.stdout):
+                stream.close()
 
 
 if __name__ == '__main__':
-    print(credit_decision(age=20, sex='M', income_source='наёмный работник', last_year_income=2.2,
-                          credit_rating=0, requested_sum=0.1, repayment_period=1, aim='ипотека'))
+    cli()
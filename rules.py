@@ -0,0 +1,229 @@
+"""Наборы правил выдачи кредита в JSON или TOML.
+
+Набор правил задаёт базовую ставку, множитель модификатора по запрошенной сумме, пенсионный возраст,
+модификаторы ставки и ограничения суммы. Ключи, которых нет в файле, берутся из base (по умолчанию - текущие
+правила main), поэтому вариант продукта можно описать только отличиями:
+
+    {"name": "ипотека-промо", "basic_interest_rate": "0.08",
+     "modifiers": {"aim": {"ипотека": "-0.03"}},
+     "caps": {"credit_rating": {"-1": 2}}}
+
+Значения ставок лучше задавать строками, чтобы они попали в Decimal без потери точности.
+Ключи кредитного рейтинга - строки с числом, отсутствие ограничения суммы - null в JSON или false в TOML.
+
+compile_rule_set превращает набор в функцию расчёта, в которую заранее подставлены ставка, пенсионный возраст
+и таблица правил, поэтому при вызове правила не разбираются. Функции разных наборов независимы,
+их можно держать одновременно, например в RuleSetRegistry. apply_rule_set делает набор текущими правилами main,
+например для потоковой обработки (python main.py --rules promo.json applications.jsonl)."""
+import json
+import os
+from decimal import Context, Decimal, localcontext
+from typing import Callable, Iterator, NamedTuple, Optional
+
+import main
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+_MODIFIER_DOMAINS = {'aim': main.AIMS, 'credit_rating': main.CREDIT_RATINGS, 'income_source': main.INCOME_SOURCES}
+_CAP_DOMAINS = {'credit_rating': main.CREDIT_RATINGS, 'income_source': main.INCOME_SOURCES}
+
+
+class RuleSet(NamedTuple):
+    """Набор правил. Модификаторы и ограничения хранятся словарями по полям заявки:
+    modifiers['aim']['ипотека'], caps['credit_rating'][-1] (None - без ограничения)"""
+
+    name: str
+    basic_interest_rate: Decimal
+    sum_modifier_factor: Decimal
+    pension_ages: dict
+    modifiers: dict
+    caps: dict
+
+
+def default_rule_set(name: str = 'default') -> RuleSet:
+    """Возвращает текущие правила main в виде набора правил"""
+
+    return RuleSet(name, main.BASIC_INTEREST_RATE, main._SUM_MODIFIER_FACTOR, dict(main.PENSION_AGES),
+                   {'aim': dict(main.AIM_MODIFIERS), 'credit_rating': dict(main.CREDIT_RATING_MODIFIERS),
+                    'income_source': dict(main.INCOME_SOURCE_MODIFIERS)},
+                   {'credit_rating': dict(main.CREDIT_RATING_CAPS), 'income_source': dict(main.INCOME_SOURCE_CAPS)})
+
+
+def _category(field: str, key):
+    """Переводит ключ из файла в значение поля заявки: рейтинг в JSON и TOML - строка"""
+
+    return int(key) if field == 'credit_rating' else key
+
+
+def _merge(field: str, base: dict, overrides: dict, domain: frozenset, parse: Callable) -> dict:
+    merged = dict(base)
+    for key, value in overrides.items():
+        merged[_category(field, key)] = parse(value)
+
+    unknown = set(merged) - domain
+    assert not unknown, f'{field}: неизвестные значения {sorted(map(str, unknown))}'
+    missing = domain - set(merged)
+    assert not missing, f'{field}: нет значений для {sorted(map(str, missing))}'
+    return merged
+
+
+def _parse_decimal(value) -> Decimal:
+    assert type(value) in (str, int, float, Decimal), f'ожидается число, получено {value!r}'
+    return Decimal(str(value))
+
+
+def _parse_cap(value) -> Optional[int]:
+    if value is None or value is False:
+        return None
+    assert type(value) is int and value > 0, f'ограничение суммы - целое число больше 0, получено {value!r}'
+    return value
+
+
+def _parse_age(value) -> int:
+    assert type(value) is int and value > main.MIN_AGE, \
+        f'пенсионный возраст - целое число больше {main.MIN_AGE}, получено {value!r}'
+    return value
+
+
+def rule_set_from_dict(data: dict, base: Optional[RuleSet] = None) -> RuleSet:
+    """Строит набор правил из словаря формата файла правил, недостающие ключи берутся из base"""
+
+    base = base or default_rule_set()
+    unknown = set(data) - {'name', 'basic_interest_rate', 'sum_modifier_factor', 'pension_ages', 'modifiers', 'caps'}
+    assert not unknown, f'неизвестные ключи набора правил: {sorted(unknown)}'
+    assert set(data.get('modifiers', {})) <= set(_MODIFIER_DOMAINS), 'modifiers: неизвестное поле'
+    assert set(data.get('caps', {})) <= set(_CAP_DOMAINS), 'caps: неизвестное поле'
+
+    return RuleSet(
+        name=data.get('name', base.name),
+        basic_interest_rate=_parse_decimal(data.get('basic_interest_rate', base.basic_interest_rate)),
+        sum_modifier_factor=_parse_decimal(data.get('sum_modifier_factor', base.sum_modifier_factor)),
+        pension_ages=_merge('pension_ages', base.pension_ages, data.get('pension_ages', {}), main.SEXES, _parse_age),
+        modifiers={field: _merge(field, base.modifiers[field], data.get('modifiers', {}).get(field, {}),
+                                 domain, _parse_decimal)
+                   for field, domain in _MODIFIER_DOMAINS.items()},
+        caps={field: _merge(field, base.caps[field], data.get('caps', {}).get(field, {}), domain, _parse_cap)
+              for field, domain in _CAP_DOMAINS.items()})
+
+
+def rule_set_to_dict(rule_set: RuleSet) -> dict:
+    """Переводит набор правил в словарь формата файла правил (для JSON)"""
+
+    return {'name': rule_set.name, 'basic_interest_rate': str(rule_set.basic_interest_rate),
+            'sum_modifier_factor': str(rule_set.sum_modifier_factor), 'pension_ages': dict(rule_set.pension_ages),
+            'modifiers': {field: {str(key): str(value) for key, value in values.items()}
+                          for field, values in rule_set.modifiers.items()},
+            'caps': {field: {str(key): value for key, value in values.items()}
+                     for field, values in rule_set.caps.items()}}
+
+
+def load_rule_set(path: str, base: Optional[RuleSet] = None) -> RuleSet:
+    """Читает набор правил из файла .json или .toml, недостающие ключи берутся из base"""
+
+    if os.path.splitext(path)[1].lower() == '.toml':
+        assert tomllib is not None, 'для TOML нужен Python 3.11+'
+        with open(path, 'rb') as file:
+            data = tomllib.load(file)
+    else:
+        with open(path, encoding='utf-8') as file:
+            data = json.load(file)
+
+    if 'name' not in data:
+        data['name'] = os.path.splitext(os.path.basename(path))[0]
+    return rule_set_from_dict(data, base)
+
+
+def _rule_table(rule_set: RuleSet) -> dict:
+    """Таблица правил набора в том же виде, что main._RULE_TABLE"""
+
+    return main._build_rule_table(rule_set.modifiers['aim'], rule_set.modifiers['credit_rating'],
+                                  rule_set.modifiers['income_source'], rule_set.caps['credit_rating'],
+                                  rule_set.caps['income_source'])
+
+
+def apply_rule_set(rule_set: RuleSet):
+    """Делает набор правил текущими правилами main, по которым считают credit_decision, потоковая обработка,
+    пакетный расчёт, кэш решений, HTTP-сервис и остальные модули. Кэши решений очищаются сами"""
+
+    main.BASIC_INTEREST_RATE = rule_set.basic_interest_rate
+    main._SUM_MODIFIER_FACTOR = rule_set.sum_modifier_factor
+    main.PENSION_AGES.update(rule_set.pension_ages)
+    for current, values in ((main.AIM_MODIFIERS, rule_set.modifiers['aim']),
+                            (main.CREDIT_RATING_MODIFIERS, rule_set.modifiers['credit_rating']),
+                            (main.INCOME_SOURCE_MODIFIERS, rule_set.modifiers['income_source']),
+                            (main.CREDIT_RATING_CAPS, rule_set.caps['credit_rating']),
+                            (main.INCOME_SOURCE_CAPS, rule_set.caps['income_source'])):
+        current.update(values)
+    main.rebuild_rule_table()
+
+
+def compile_rule_set(rule_set: RuleSet, engine: str = 'decimal',
+                     context: Optional[Context] = None) -> Callable[..., main.Decision]:
+    """Возвращает функцию расчёта по набору правил с сигнатурой main.evaluate без engine:
+    score(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period, aim,
+    trusted=False) -> main.Decision. Считает тот же main._score_decimal (engine='decimal') или main._score_float
+    (engine='float'), что и main.evaluate, с заранее подставленными правилами набора.
+    При заданном context Decimal-расчёт идёт в копии этого контекста, а не в контексте потока"""
+
+    assert engine in main.ENGINES, f'engine: неизвестный движок {engine}'
+    rule_table = _rule_table(rule_set)
+    arguments = (rule_table, dict(rule_set.pension_ages), rule_set.basic_interest_rate, rule_set.sum_modifier_factor)
+    if engine == 'float':
+        arguments = (rule_table, main._build_float_rule_table(rule_table), *arguments[1:],
+                     float(rule_set.sum_modifier_factor))
+    score_rules = main._score_float if engine == 'float' else main._score_decimal
+    check_inputs = main._check_inputs
+
+    def score(age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+              requested_sum, repayment_period, aim: str, trusted: bool = False) -> main.Decision:
+        if not trusted:
+            check_inputs(age, sex, income_source, last_year_income, credit_rating,
+                         requested_sum, repayment_period, aim)
+        if context is None:
+            return score_rules(*arguments, age, sex, income_source, last_year_income, credit_rating,
+                               requested_sum, repayment_period, aim)
+
+        # localcontext работает с копией context, поэтому флаги одного вызова не видны другим потокам
+        with localcontext(context):
+            return score_rules(*arguments, age, sex, income_source, last_year_income, credit_rating,
+                               requested_sum, repayment_period, aim)
+
+    return score
+
+
+class RuleSetRegistry:
+    """Скомпилированные наборы правил по имени, например варианты продукта, работающие одновременно"""
+
+    def __init__(self):
+        self._rule_sets = {}
+        self._scorers = {}
+
+    def add(self, rule_set: RuleSet):
+        """Компилирует набор правил для всех движков и регистрирует его под rule_set.name, заменяя прежний"""
+
+        scorers = {engine: compile_rule_set(rule_set, engine) for engine in main.ENGINES}
+        self._rule_sets[rule_set.name] = rule_set
+        self._scorers[rule_set.name] = scorers
+
+    def remove(self, name: str):
+        del self._rule_sets[name], self._scorers[name]
+
+    def rule_set(self, name: str) -> RuleSet:
+        return self._rule_sets[name]
+
+    def scorer(self, name: str, engine: str = 'decimal') -> Callable[..., main.Decision]:
+        """Возвращает функцию расчёта набора name (см. compile_rule_set)"""
+
+        return self._scorers[name][engine]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._rule_sets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rule_sets)
+
+    def __len__(self) -> int:
+        return len(self._rule_sets)
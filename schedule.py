@@ -0,0 +1,168 @@
+"""Графики погашения кредитов.
+
+Годовой платёж credit_decision - это S * (1 + n * r) / n = S / n + S * r, где S - разрешённая сумма,
+n - срок в годах, r - базовая ставка с модификатором. Значит, каждый год гасится S / n основного долга
+и платится S * r процентов. График делит это на платежи по годам или месяцам (frequency): платёж округляется
+до 8 знаков, как годовой платёж, проценты тоже, основной долг - разность. Последний платёж закрывает остаток долга,
+а при дробном сроке проценты в нём берутся за неполный период. Годовой график целого срока повторяет платёж
+credit_decision в каждой строке, кроме последней.
+
+amortization_schedule лениво выдаёт строки графика одной заявки в Decimal-расчёте.
+write_schedules пишет графики всех одобренных заявок пакета в файл через NumPy (во float64 с округлением
+до 8 знаков, поэтому доли основного долга и процентов могут отличаться от amortization_schedule в последнем знаке)."""
+from decimal import ROUND_CEILING, Decimal
+from typing import Iterator, NamedTuple, TextIO
+
+import main
+
+PERIODS_PER_YEAR = {'annual': 1, 'monthly': 12}
+SCHEDULE_FIELDS = ('loan', 'number', 'payment', 'principal', 'interest', 'balance')
+# Записи двоичного формата write_schedules: numpy.fromfile(path, dtype=SCHEDULE_RECORD_FORMAT)
+SCHEDULE_RECORD_FORMAT = [('loan', '<i8'), ('number', '<i4'), ('payment', '<f8'), ('principal', '<f8'),
+                          ('interest', '<f8'), ('balance', '<f8')]
+DEFAULT_CHUNK_SIZE = 10000
+DEFAULT_MAX_ROWS = 100000
+_CSV_LINE = '%d,%d,%.8f,%.8f,%.8f,%.8f\n'
+
+
+class ScheduleRow(NamedTuple):
+    """Строка графика: номер платежа с 1, платёж, погашение основного долга, проценты и остаток долга после платежа"""
+
+    number: int
+    payment: float
+    principal: float
+    interest: float
+    balance: float
+
+
+def iter_schedule(allowed_sum, interest_rate, repayment_period, frequency: str = 'annual') -> Iterator[ScheduleRow]:
+    """Лениво выдаёт график по разрешённой сумме, полной ставке (базовая с модификатором) и сроку в годах"""
+
+    periods_per_year = PERIODS_PER_YEAR[frequency]
+    allowed_sum, interest_rate = Decimal(str(allowed_sum)), Decimal(str(interest_rate))
+    years = Decimal(str(repayment_period))
+    periods = years * periods_per_year
+    row_count = int(periods.to_integral_value(rounding=ROUND_CEILING))
+
+    # платёж считается так же, как в credit_decision, чтобы годовой график повторял его в точности
+    payment = (allowed_sum * (1 + years * interest_rate) / years / periods_per_year).quantize(main._PAYMENT_QUANTUM)
+    period_interest = allowed_sum * interest_rate / periods_per_year
+    interest = period_interest.quantize(main._PAYMENT_QUANTUM)
+    principal = payment - interest
+
+    balance = allowed_sum
+    for number in range(1, row_count):
+        balance -= principal
+        yield ScheduleRow(number, float(payment), float(principal), float(interest), float(balance))
+
+    last_interest = (period_interest * (periods - row_count + 1)).quantize(main._PAYMENT_QUANTUM)
+    yield ScheduleRow(row_count, float(balance + last_interest), float(balance), float(last_interest), 0.0)
+
+
+def amortization_schedule(age: int, sex: str, income_source: str, last_year_income: float,
+                          credit_rating: int, requested_sum, repayment_period, aim: str,
+                          frequency: str = 'annual', trusted: bool = False) -> Iterator[ScheduleRow]:
+    """Возвращает ленивый график погашения по заявке, при отказе - пустой.
+    Входные данные проверяются сразу при вызове"""
+
+    assert frequency in PERIODS_PER_YEAR, f'frequency: неизвестная периодичность {frequency}'
+    decision = main.evaluate(age, sex, income_source, last_year_income, credit_rating, requested_sum,
+                             repayment_period, aim, trusted=trusted)
+    if not decision.verdict:
+        return iter(())
+
+    return iter_schedule(decision.allowed_sum, main.BASIC_INTEREST_RATE + decision.rate_modifier,
+                         repayment_period, frequency)
+
+
+def write_schedules(stream: TextIO, age, sex, income_source, last_year_income, credit_rating,
+                    requested_sum, repayment_period, aim, frequency: str = 'annual', output_format: str = 'csv',
+                    chunk_size: int = DEFAULT_CHUNK_SIZE, max_rows: int = DEFAULT_MAX_ROWS,
+                    trusted: bool = False) -> int:
+    """Пишет графики всех одобренных заявок из столбцов (как у batch.credit_decision_batch) в stream блоками
+    не больше chunk_size заявок и max_rows строк графиков (но не меньше одной заявки), без построения графиков
+    по одному, поэтому память не зависит от сроков кредитов. Поле loan - номер строки заявки во входных столбцах.
+    output_format: csv - текст с заголовком SCHEDULE_FIELDS, binary - записи SCHEDULE_RECORD_FORMAT
+    (stream тогда открыт в двоичном режиме). Возвращает число записанных строк графиков"""
+
+    import numpy as np
+
+    import batch
+
+    assert frequency in PERIODS_PER_YEAR, f'frequency: неизвестная периодичность {frequency}'
+    assert output_format in ('csv', 'binary'), f'output_format: неизвестный формат {output_format}'
+    assert chunk_size >= 1, 'chunk_size: меньше 1'
+    assert max_rows >= 1, 'max_rows: меньше 1'
+    periods_per_year = PERIODS_PER_YEAR[frequency]
+
+    columns, errors = batch._prepare(age, sex, income_source, last_year_income, credit_rating,
+                                     requested_sum, repayment_period, aim, validate=not trusted)
+    if errors is not None:
+        invalid_rows = np.flatnonzero(errors)
+        assert not len(invalid_rows), f'некорректные строки: {invalid_rows[:10].tolist()}'
+    verdicts, annual_payments, _ = batch.credit_decision_codes(*columns.values())
+
+    # параметры графика по каждой одобренной заявке: на них память уходит по заявкам, а не по строкам графиков
+    loans = np.flatnonzero(verdicts)
+    credit_sum = np.asarray(columns['requested_sum'], dtype=np.float64)[loans]
+    years = np.asarray(columns['repayment_period'], dtype=np.float64)[loans]
+    modifiers, caps, _ = batch._rule_arrays()
+    rule_index = (columns['aim'][loans], columns['credit_rating'][loans], columns['income_source'][loans])
+    allowed_sum = np.minimum(credit_sum, caps[rule_index])
+    interest_rate = (float(main.BASIC_INTEREST_RATE) + modifiers[rule_index]
+                     - np.log10(credit_sum) * float(main._SUM_MODIFIER_FACTOR))
+
+    periods = years * periods_per_year
+    row_counts = np.ceil(periods).astype(np.int64)
+    period_interest = allowed_sum * interest_rate / periods_per_year
+    if periods_per_year == 1:
+        payment = annual_payments[loans]
+    else:
+        payment = np.round(allowed_sum / periods + period_interest, 8)
+    interest = np.round(period_interest, 8)
+    principal = np.round(payment - interest, 8)
+    last_balance = np.round(allowed_sum - (row_counts - 1) * principal, 8)
+    last_interest = np.round(period_interest * (periods - row_counts + 1), 8)
+    row_ends = np.cumsum(row_counts)
+
+    record_dtype = np.dtype(SCHEDULE_RECORD_FORMAT)
+    if output_format == 'csv':
+        stream.write(','.join(SCHEDULE_FIELDS) + '\n')
+
+    written = start = 0
+    while start < len(loans):
+        end = min(start + chunk_size, max(start + 1, int(np.searchsorted(row_ends, written + max_rows, 'right'))))
+
+        # строки графиков заявок блока подряд: номер заявки и номер платежа
+        block_counts = row_counts[start:end]
+        row_loans = np.repeat(np.arange(start, end), block_counts)
+        first_rows = row_ends[start:end] - block_counts - written
+        numbers = np.arange(len(row_loans)) - first_rows[row_loans - start] + 1
+
+        records = np.empty(len(row_loans), dtype=record_dtype)
+        records['loan'] = loans[row_loans]
+        records['number'] = numbers
+        records['payment'] = payment[row_loans]
+        records['principal'] = principal[row_loans]
+        records['interest'] = interest[row_loans]
+        records['balance'] = np.round(allowed_sum[row_loans] - numbers * principal[row_loans], 8)
+
+        last_rows = first_rows + block_counts - 1
+        records['principal'][last_rows] = last_balance[start:end]
+        records['interest'][last_rows] = last_interest[start:end]
+        records['payment'][last_rows] = np.round(last_balance[start:end] + last_interest[start:end], 8)
+        records['balance'][last_rows] = 0
+
+        if output_format == 'csv':
+            # одна строка формата на весь блок: в несколько раз быстрее numpy.savetxt, форматирующего по строке.
+            # Значения собираются по столбцам в один плоский список, без кортежа на каждую строку
+            values = [None] * (len(records) * len(SCHEDULE_FIELDS))
+            for position, field in enumerate(SCHEDULE_FIELDS):
+                values[position::len(SCHEDULE_FIELDS)] = records[field].tolist()
+            stream.write((_CSV_LINE * len(records)) % tuple(values))
+        else:
+            stream.write(records.tobytes())
+        written += len(records)
+        start = end
+
+    return written
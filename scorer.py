@@ -0,0 +1,60 @@
+"""Объект расчёта решений по кредиту для многопоточных серверов.
+
+CreditScorer хранит свой набор правил (rules.RuleSet), признак печати и контекст Decimal и не читает
+глобальные VERBOSE, BASIC_INTEREST_RATE и контекст Decimal потока. Расчёт - функция rules.compile_rule_set,
+то есть тот же main._score_decimal, что и в main.evaluate, с правилами набора и контекстом объекта.
+
+Все поля объекта после создания только читаются. Единственное изменяемое состояние - флаги контекста Decimal,
+которые выставляются при вычислениях, поэтому каждый вызов считает в своей копии контекста. Так один объект
+можно использовать из пула потоков, в том числе в сборках Python без GIL.
+
+    scorer = CreditScorer()
+    with ThreadPoolExecutor() as executor:
+        decisions = list(executor.map(lambda application: scorer.evaluate(**application), applications))"""
+from decimal import ROUND_HALF_EVEN, Context, DivisionByZero, InvalidOperation, Overflow
+from typing import Optional, Tuple
+
+import main
+import rules
+
+
+def default_context() -> Context:
+    """Контекст Decimal, в котором считает main по умолчанию: 28 знаков, банковское округление"""
+
+    return Context(prec=28, rounding=ROUND_HALF_EVEN, traps=[InvalidOperation, DivisionByZero, Overflow])
+
+
+class CreditScorer:
+    """Расчёт решений по набору правил rule_set (по умолчанию - текущие правила main) в контексте context.
+    Результаты в контексте по умолчанию совпадают с main.evaluate"""
+
+    def __init__(self, rule_set: Optional[rules.RuleSet] = None, verbose: bool = False,
+                 context: Optional[Context] = None):
+        self.rule_set = rule_set or rules.default_rule_set()
+        self.verbose = verbose
+        self.context = (context or default_context()).copy()
+        self._score = rules.compile_rule_set(self.rule_set, 'decimal', self.context)
+
+    def evaluate(self, age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+                 requested_sum, repayment_period, aim: str, trusted: bool = False) -> main.Decision:
+        """Аналог main.evaluate: проверяет входные данные (кроме trusted=True) и возвращает решение без печати"""
+
+        return self._score(age, sex, income_source, last_year_income, credit_rating,
+                           requested_sum, repayment_period, aim, trusted)
+
+    def credit_decision(self, age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+                        requested_sum, repayment_period, aim: str,
+                        trusted: bool = False) -> Tuple[bool, Optional[float]]:
+        """Аналог main.credit_decision, печатает решение при verbose"""
+
+        decision = self._score(age, sex, income_source, last_year_income, credit_rating,
+                               requested_sum, repayment_period, aim, trusted)
+        if self.verbose:
+            print(main.format_decision(decision, {'age': age, 'sex': sex, 'income_source': income_source,
+                                                  'last_year_income': last_year_income, 'credit_rating': credit_rating,
+                                                  'requested_sum': requested_sum, 'repayment_period': repayment_period,
+                                                  'aim': aim}))
+
+        return decision.as_tuple()
+
+    __call__ = credit_decision
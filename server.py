@@ -0,0 +1,234 @@
+"""Асинхронный HTTP-сервис решений по кредиту на asyncio.
+
+Одновременные запросы собираются в порцию, пока не наберётся max_batch_size заявок или не пройдёт max_delay
+секунд с первой заявки порции, и порция рассчитывается за один проход.
+
+POST /decision - заявка JSON-объектом (или списком заявок), ответ - решение в формате main.decide_applications
+GET /metrics - задержки p50/p99, пропускная способность и средний размер порции,
+а при включённом instrumentation - и его метрики
+
+Запуск: python server.py --port 8080 --max-batch-size 64 --max-delay-ms 2 [--rules promo.json]"""
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+import main
+
+_STATUS_TEXTS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                 500: 'Internal Server Error'}
+
+
+class ServerMetrics:
+    """Счётчики запросов и порций и скользящее окно задержек последних window запросов"""
+
+    def __init__(self, window: int = 10000):
+        self.requests = 0
+        self.batches = 0
+        self.batched_applications = 0
+        self.started = time.monotonic()
+        self._latencies = deque(maxlen=window)
+
+    def record_request(self, latency: float):
+        self.requests += 1
+        self._latencies.append(latency)
+
+    def record_batch(self, size: int):
+        self.batches += 1
+        self.batched_applications += size
+
+    def snapshot(self) -> dict:
+        """Возвращает метрики, задержки в миллисекундах"""
+
+        latencies = sorted(self._latencies)
+
+        def _percentile(quantile):
+            return latencies[round(quantile * (len(latencies) - 1))] * 1000 if latencies else None
+
+        uptime = time.monotonic() - self.started
+        return {'requests': self.requests, 'batches': self.batches,
+                'mean_batch_size': self.batched_applications / self.batches if self.batches else None,
+                'latency_p50_ms': _percentile(0.5), 'latency_p99_ms': _percentile(0.99),
+                'throughput_rps': self.requests / uptime if uptime else None, 'uptime_s': uptime}
+
+
+class MicroBatcher:
+    """Собирает заявки одновременных запросов в порции и рассчитывает каждую порцию за один проход"""
+
+    def __init__(self, max_batch_size: int = 64, max_delay: float = 0.002,
+                 metrics: Optional[ServerMetrics] = None):
+        assert max_batch_size >= 1, 'max_batch_size: меньше 1'
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.metrics = metrics or ServerMetrics()
+        self._pending = []
+        self._timer = None
+
+    async def decide(self, application) -> dict:
+        """Возвращает решение по заявке после расчёта её порции"""
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((application, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+
+        return await future
+
+    def flush(self):
+        """Рассчитывает накопленную порцию и передаёт решения ожидающим запросам"""
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        applications = [application for application, _ in batch]
+        try:
+            decisions = main._decide_chunk(applications)
+        except Exception:
+            # ошибка расчёта одной заявки не должна оставить без ответа остальные запросы порции:
+            # заявки пересчитываются по одной, и исключение получает только запрос с ошибочной заявкой
+            decisions = []
+            for application in applications:
+                try:
+                    decisions.append(main._decide_application(application))
+                except Exception as error:
+                    decisions.append(error)
+
+        self.metrics.record_batch(len(batch))
+        for (_, future), decision in zip(batch, decisions):
+            if future.done():
+                continue
+            if isinstance(decision, Exception):
+                future.set_exception(decision)
+            else:
+                future.set_result(decision)
+
+
+class ScoringServer:
+    """HTTP/1.1 сервер с keep-alive поверх asyncio.start_server"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080, max_batch_size: int = 64,
+                 max_delay: float = 0.002):
+        self.host = host
+        self.port = port
+        self.metrics = ServerMetrics()
+        self.batcher = MicroBatcher(max_batch_size, max_delay, self.metrics)
+        self._server = None
+
+    async def start(self) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self._server
+
+    async def serve_forever(self):
+        server = self._server or await self.start()
+        async with server:
+            await server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin-1').split(maxsplit=2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                started = time.perf_counter()
+                status, payload = await self._route(method, path, body)
+                if method == 'POST':
+                    self.metrics.record_request(time.perf_counter() - started)
+
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version.strip().upper() != 'HTTP/1.0')
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ArithmeticError, ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method: str, path: str, body: bytes) -> Tuple[int, object]:
+        if path == '/metrics':
+            if method != 'GET':
+                return 405, {'error': 'ожидается GET'}
+            snapshot = self.metrics.snapshot()
+            if main.INSTRUMENTATION is not None:
+                snapshot['instrumentation'] = main.INSTRUMENTATION.as_dict()
+            return 200, snapshot
+        if path != '/decision':
+            return 404, {'error': 'неизвестный путь'}
+        if method != 'POST':
+            return 405, {'error': 'ожидается POST'}
+
+        try:
+            applications = json.loads(body)
+        except ValueError as error:
+            return 400, {'error': f'{type(error).__name__}: {error}'}
+
+        try:
+            if isinstance(applications, list):
+                return 200, list(await asyncio.gather(*map(self.batcher.decide, applications)))
+            decision = await self.batcher.decide(applications)
+        except Exception as error:
+            # непредвиденный сбой расчёта не обрывает соединение: клиент получает ответ 500 с текстом ошибки
+            return 500, {'error': f'{type(error).__name__}: {error}'}
+        return (400 if decision['error'] else 200), decision
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload, keep_alive: bool):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status} {_STATUS_TEXTS[status]}\r\n'
+                     f'Content-Type: application/json; charset=utf-8\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + body)
+
+
+def run(host: str = '127.0.0.1', port: int = 8080, max_batch_size: int = 64, max_delay: float = 0.002):
+    """Запускает сервис до прерывания"""
+
+    asyncio.run(ScoringServer(host, port, max_batch_size, max_delay).serve_forever())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTTP-сервис решений по кредиту')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--max-batch-size', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=2.0)
+    parser.add_argument('--rules', help='файл набора правил JSON или TOML (см. rules.py)')
+    args = parser.parse_args()
+
+    if args.rules:
+        import rules
+
+        rules.apply_rule_set(rules.load_rule_set(args.rules))
+
+    try:
+        run(args.host, args.port, args.max_batch_size, args.max_delay_ms / 1000)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,247 @@
+"""Встречные предложения по заявкам: наибольшая одобряемая сумма и наименьший одобряемый срок.
+
+При фиксированном сроке одобряемые запрошенные суммы образуют отрезок [0.1, максимум] (см. surface),
+а при фиксированной сумме одобряемые сроки - отрезок [минимум, максимум]: пенсионный возраст ограничивает
+срок сверху, треть дохода (срок >= 3 * сумма / доход) и половина дохода (платёж S / n + S * r убывает по сроку,
+r от срока не зависит) - снизу. Ограничение суммы и категориальные отказы от срока не зависят.
+
+Граница находится из этих условий напрямую (для суммы - делением отрезка пополам во float), округляется
+до сетки sum_precision (period_precision) знаков после запятой и уточняется точным расчётом на соседних узлах
+сетки. Поэтому ответ - это значение сетки, которое credit_decision одобряет, а следующее значение сетки - нет."""
+from math import ceil, floor, log10
+from typing import NamedTuple, Optional, Tuple
+
+import main
+import surface
+
+DEFAULT_SUM_PRECISION = 2
+DEFAULT_PERIOD_PRECISION = 0
+
+
+class CounterOffer(NamedTuple):
+    """Наибольшая одобряемая сумма на запрошенный срок и наименьший одобряемый срок для запрошенной суммы
+    с годовыми платежами по ним, None - такого предложения нет"""
+
+    max_sum: Optional[float]
+    max_sum_payment: Optional[float]
+    min_period: Optional[float]
+    min_period_payment: Optional[float]
+
+
+def _grid_value(index: int, scale: int):
+    return index // scale if scale == 1 else index / scale
+
+
+def _sum_bounds(sum_precision: int) -> Tuple[int, int, int]:
+    scale = 10 ** sum_precision
+    return scale, ceil(main.MIN_REQUESTED_SUM * scale), floor(main.MAX_REQUESTED_SUM * scale)
+
+
+def _period_bounds(period_precision: int) -> Tuple[int, int, int]:
+    scale = 10 ** period_precision
+    return scale, ceil(main.MIN_REPAYMENT_PERIOD * scale), floor(main.MAX_REPAYMENT_PERIOD * scale)
+
+
+def max_approvable_sum(age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+                       repayment_period, aim: str,
+                       sum_precision: int = DEFAULT_SUM_PRECISION) -> Optional[Tuple[float, float]]:
+    """Наибольшая запрошенная сумма с sum_precision знаками, которую credit_decision одобряет на срок
+    repayment_period, и годовой платёж по ней. None - ни одна сумма не одобряется"""
+
+    scale, low, high = _sum_bounds(sum_precision)
+
+    def _decision(index):
+        return main.evaluate(age, sex, income_source, last_year_income, credit_rating,
+                             _grid_value(index, scale), repayment_period, aim, trusted=True)
+
+    approximate = surface.max_approvable_sum(age, sex, income_source, last_year_income, credit_rating,
+                                             repayment_period, aim)
+    index = low if approximate is None else min(max(floor(approximate * scale), low), high)
+    decision = _decision(index)
+    while not decision.verdict:
+        index -= 1
+        if index < low:
+            return None
+        decision = _decision(index)
+
+    while index < high:
+        next_decision = _decision(index + 1)
+        if not next_decision.verdict:
+            break
+        index, decision = index + 1, next_decision
+
+    return _grid_value(index, scale), decision.annual_payment
+
+
+def _approximate_min_period(income_source: str, last_year_income: float, credit_rating: int, requested_sum,
+                            aim: str) -> float:
+    """Наименьший срок из условий трети и половины дохода во float, inf - таких сроков нет"""
+
+    categorical_modifier = main._FLOAT_RULE_TABLE[aim, credit_rating, income_source][0]
+    interest_rate = (float(main.BASIC_INTEREST_RATE) + categorical_modifier
+                     - log10(requested_sum) * float(main._SUM_MODIFIER_FACTOR))
+    payment_room = last_year_income / 2 - requested_sum * interest_rate
+    if last_year_income <= 0 or payment_room <= 0:
+        return float('inf')
+    return max(3 * requested_sum / last_year_income, requested_sum / payment_room)
+
+
+def min_approvable_period(age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+                          requested_sum, aim: str,
+                          period_precision: int = DEFAULT_PERIOD_PRECISION) -> Optional[Tuple[float, float]]:
+    """Наименьший срок с period_precision знаками, на который credit_decision одобряет сумму requested_sum,
+    и годовой платёж на этот срок. None - ни один срок не подходит"""
+
+    scale, low, high = _period_bounds(period_precision)
+    high = min(high, floor((main.PENSION_AGES[sex] - age) * scale))
+
+    def _decision(index):
+        return main.evaluate(age, sex, income_source, last_year_income, credit_rating,
+                             requested_sum, _grid_value(index, scale), aim, trusted=True)
+
+    if high < low or not _decision(high).verdict:
+        return None
+
+    approximate = _approximate_min_period(income_source, last_year_income, credit_rating, requested_sum, aim)
+    index = high if approximate * scale > high else max(ceil(approximate * scale), low)
+    decision = _decision(index)
+    while not decision.verdict:
+        index += 1
+        decision = _decision(index)
+
+    while index > low:
+        previous_decision = _decision(index - 1)
+        if not previous_decision.verdict:
+            break
+        index, decision = index - 1, previous_decision
+
+    return _grid_value(index, scale), decision.annual_payment
+
+
+def counter_offer(age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+                  requested_sum, repayment_period, aim: str, sum_precision: int = DEFAULT_SUM_PRECISION,
+                  period_precision: int = DEFAULT_PERIOD_PRECISION, trusted: bool = False) -> CounterOffer:
+    """Встречное предложение по заявке: наибольшая сумма на запрошенный срок и наименьший срок
+    для запрошенной суммы"""
+
+    if not trusted:
+        main._check_inputs(age, sex, income_source, last_year_income, credit_rating,
+                           requested_sum, repayment_period, aim)
+
+    by_sum = max_approvable_sum(age, sex, income_source, last_year_income, credit_rating, repayment_period, aim,
+                                sum_precision) or (None, None)
+    by_period = min_approvable_period(age, sex, income_source, last_year_income, credit_rating, requested_sum, aim,
+                                      period_precision) or (None, None)
+    return CounterOffer(*by_sum, *by_period)
+
+
+def counter_offers_batch(age, sex, income_source, last_year_income, credit_rating, requested_sum, repayment_period,
+                         aim, sum_precision: int = DEFAULT_SUM_PRECISION,
+                         period_precision: int = DEFAULT_PERIOD_PRECISION, trusted: bool = False) -> tuple:
+    """Векторный аналог counter_offer для столбцов (как у batch.credit_decision_batch), например для всей очереди
+    отказов. Возвращает четыре массива float в порядке полей CounterOffer, NaN - предложения нет.
+    Границы находятся во float по всем строкам сразу и уточняются точным batch.credit_decision_codes"""
+
+    import numpy as np
+
+    import batch
+
+    columns, errors = batch._prepare(age, sex, income_source, last_year_income, credit_rating,
+                                     requested_sum, repayment_period, aim, validate=not trusted)
+    if errors is not None:
+        invalid_rows = np.flatnonzero(errors)
+        assert not len(invalid_rows), f'некорректные строки: {invalid_rows[:10].tolist()}'
+
+    age = np.asarray(columns['age']).astype(np.int64)
+    income = np.asarray(columns['last_year_income'], dtype=np.float64)
+    credit_sum = np.asarray(columns['requested_sum'], dtype=np.float64)
+    period = np.asarray(columns['repayment_period'], dtype=np.float64)
+    codes = {field: columns[field] for field in ('sex', 'income_source', 'credit_rating', 'aim')}
+    modifiers, caps, pension_ages = batch._rule_arrays()
+    rule_index = (codes['aim'], codes['credit_rating'], codes['income_source'])
+    categorical_modifier, credit_sum_cap = modifiers[rule_index], caps[rule_index]
+    interest_rate = float(main.BASIC_INTEREST_RATE) + categorical_modifier
+    sum_modifier_factor = float(main._SUM_MODIFIER_FACTOR)
+    rows = len(age)
+
+    def _approved(row_index, sums, periods):
+        return batch.credit_decision_codes(age[row_index], codes['sex'][row_index],
+                                           codes['income_source'][row_index], income[row_index],
+                                           codes['credit_rating'][row_index], sums, periods,
+                                           codes['aim'][row_index])
+
+    def _refine(indices, feasible, step, low, high, value, sums_vary):
+        """Сдвигает индексы сетки к границе одобрения: против step до первого одобренного узла, затем по step,
+        пока следующий узел одобряется. Возвращает значения сетки и платежи, NaN - решения нет"""
+
+        payments = np.full(rows, np.nan)
+
+        def _check(row_index, grid_index):
+            values = value(grid_index)
+            if sums_vary:
+                return _approved(row_index, values, period[row_index])
+            return _approved(row_index, credit_sum[row_index], values)
+
+        active = np.flatnonzero(feasible)
+        while len(active):
+            verdicts, annual_payments, _ = _check(active, indices[active])
+            payments[active[verdicts]] = annual_payments[verdicts]
+            active = active[~verdicts]
+            indices[active] -= step
+            out_of_range = (indices[active] < low) | (indices[active] > high[active])
+            feasible[active[out_of_range]] = False
+            active = active[~out_of_range]
+
+        active = np.flatnonzero(feasible)
+        while len(active):
+            candidates = indices[active] + step
+            in_range = (candidates >= low) & (candidates <= high[active])
+            active, candidates = active[in_range], candidates[in_range]
+            verdicts, annual_payments, _ = _check(active, candidates)
+            active, candidates = active[verdicts], candidates[verdicts]
+            indices[active] = candidates
+            payments[active] = annual_payments[verdicts]
+
+        payments[~feasible] = np.nan
+        return np.where(feasible, value(indices), np.nan), payments
+
+    everyone = np.arange(rows)
+
+    # наибольшая сумма на запрошенный срок: верхняя граница из ограничения суммы и трети дохода,
+    # затем деление пополам по условию половины дохода
+    scale, low, high = _sum_bounds(sum_precision)
+    upper = np.minimum(np.minimum(float(main.MAX_REQUESTED_SUM), income * period / 3), credit_sum_cap)
+    lower = np.full(rows, float(main.MIN_REQUESTED_SUM))
+    upper = np.maximum(upper, lower)
+
+    def _sum_payment(sums):
+        return sums * (1 / period + interest_rate - np.log10(sums) * sum_modifier_factor)
+
+    approved_upper = _sum_payment(upper) <= income / 2
+    for _ in range(surface._BISECTION_STEPS):
+        middle = (lower + upper) / 2
+        fits = _sum_payment(middle) <= income / 2
+        lower = np.where(fits, middle, lower)
+        upper = np.where(fits, upper, middle)
+    approximate_sums = np.where(approved_upper, upper, lower)
+
+    sum_indices = np.clip(np.floor(approximate_sums * scale), low, high).astype(np.int64)
+    feasible = _approved(everyone, np.full(rows, low / scale), period)[0]
+    max_sums, max_sum_payments = _refine(sum_indices, feasible, 1, low, np.full(rows, high),
+                                         lambda indices: indices / scale, True)
+
+    # наименьший срок для запрошенной суммы: снизу трети и половины дохода, сверху - пенсионный возраст
+    scale, low, high = _period_bounds(period_precision)
+    period_high = np.minimum(high, np.floor((pension_ages[codes['sex']] - age) * scale)).astype(np.int64)
+    payment_room = income / 2 - credit_sum * (interest_rate - np.log10(credit_sum) * sum_modifier_factor)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        approximate_periods = np.where((income > 0) & (payment_room > 0),
+                                       np.maximum(3 * credit_sum / income, credit_sum / payment_room), np.inf)
+    period_indices = np.clip(np.ceil(np.minimum(approximate_periods, high) * scale), low,
+                             np.maximum(period_high, low)).astype(np.int64)
+    feasible = period_high >= low
+    feasible[feasible] = _approved(everyone[feasible], credit_sum[feasible], period_high[feasible] / scale)[0]
+    min_periods, min_period_payments = _refine(period_indices, feasible, -1, low, period_high,
+                                               lambda indices: indices / scale, False)
+
+    return max_sums, max_sum_payments, min_periods, min_period_payments
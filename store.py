@@ -0,0 +1,195 @@
+"""Колоночное хранилище портфеля заявок для повторных пересчётов.
+
+Портфель - каталог с файлом meta.json и одним двоичным файлом на столбец. Числовые столбцы хранятся
+фиксированной ширины, категории - кодами uint8 (индексами в batch.SEXES, INCOME_SOURCES, CREDIT_RATINGS и AIMS).
+Портфель открывается через numpy.memmap без чтения в память и считается batch.credit_decision_codes
+без копирования столбцов. Новые заявки дописываются в конец файлов.
+
+    write_portfolio('portfolio', columns)               # создать
+    write_portfolio('portfolio', columns, append=True)  # дописать
+    rows, skipped = import_applications('portfolio', main.read_applications(stream))
+    for start, (verdicts, payments, masks) in open_portfolio('portfolio').score():
+        ..."""
+import json
+import os
+import shutil
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
+
+import numpy as np
+
+import batch
+import main
+
+FORMAT_VERSION = 1
+META_FILE = 'meta.json'
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+COLUMN_DTYPES = {
+    'age': np.dtype('<i2'),
+    'sex': np.dtype('u1'),
+    'income_source': np.dtype('u1'),
+    'last_year_income': np.dtype('<f8'),
+    'credit_rating': np.dtype('u1'),
+    'requested_sum': np.dtype('<f8'),
+    'repayment_period': np.dtype('<f8'),
+    'aim': np.dtype('u1'),
+}
+DOMAINS = {'sex': batch.SEXES, 'income_source': batch.INCOME_SOURCES,
+           'credit_rating': batch.CREDIT_RATINGS, 'aim': batch.AIMS}
+
+
+def _column_path(path: str, field: str) -> str:
+    return os.path.join(path, f'{field}.bin')
+
+
+def _read_meta(path: str) -> dict:
+    with open(os.path.join(path, META_FILE), encoding='utf-8') as file:
+        meta = json.load(file)
+
+    assert meta['version'] == FORMAT_VERSION, f"неподдерживаемая версия формата {meta['version']}"
+    assert meta['domains'] == {field: list(domain) for field, domain in DOMAINS.items()}, \
+        'коды категорий портфеля не совпадают с текущими'
+    return meta
+
+
+def _write_meta(path: str, rows: int):
+    meta = {'version': FORMAT_VERSION, 'rows': rows,
+            'columns': {field: dtype.str for field, dtype in COLUMN_DTYPES.items()},
+            'domains': {field: list(domain) for field, domain in DOMAINS.items()}}
+    temporary_path = os.path.join(path, META_FILE + '.tmp')
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        json.dump(meta, file, ensure_ascii=False, indent=2)
+    os.replace(temporary_path, os.path.join(path, META_FILE))
+
+
+def _prepare_rows(columns: dict) -> Tuple[dict, np.ndarray]:
+    """Кодирует столбцы заявок и возвращает их вместе с маской строк, которые можно записать:
+    прошедших проверку batch.validate_columns и с возрастом, который помещается в столбец age"""
+
+    prepared, errors = batch._prepare(**{field: columns[field] for field in COLUMN_DTYPES}, validate=True)
+    valid = errors == 0
+    valid[valid] = (prepared['age'][valid] <= np.iinfo(COLUMN_DTYPES['age']).max).astype(bool)
+    return prepared, valid
+
+
+def write_portfolio(path: str, columns: dict, append: bool = False) -> int:
+    """Записывает столбцы заявок (как у batch.credit_decision_batch) в портфель, при append - в конец
+    существующего портфеля. Заявки проверяются до записи, при некорректных строках выбрасывается AssertionError.
+    Возвращает количество строк в портфеле"""
+
+    prepared, valid = _prepare_rows(columns)
+    invalid_rows = np.flatnonzero(~valid)
+    assert not len(invalid_rows), f'некорректные строки: {invalid_rows[:10].tolist()}'
+
+    if append:
+        rows = _read_meta(path)['rows']
+    else:
+        os.makedirs(path, exist_ok=True)
+        rows = 0
+
+    for field, dtype in COLUMN_DTYPES.items():
+        with open(_column_path(path, field), 'r+b' if append else 'wb') as file:
+            # при append файл обрезается до числа строк в meta.json, если прошлая запись прервалась
+            file.truncate(rows * dtype.itemsize)
+            file.seek(0, os.SEEK_END)
+            file.write(np.ascontiguousarray(prepared[field], dtype=dtype).tobytes())
+
+    rows += len(valid)
+    _write_meta(path, rows)
+    return rows
+
+
+class ImportResult(NamedTuple):
+    """Итог import_applications: количество строк в портфеле и номера пропущенных заявок во входном потоке"""
+
+    rows: int
+    skipped: List[int]
+
+
+def import_applications(path: str, applications: Iterable, chunk_size: int = DEFAULT_CHUNK_SIZE) -> ImportResult:
+    """Записывает поток заявок-словарей (например, из main.read_applications) в новый портфель порциями,
+    не держа весь поток в памяти. Некорректные заявки и ошибки разбора из read_applications пропускаются,
+    их номера во входном потоке возвращаются в skipped.
+    Портфель собирается в соседнем каталоге <path>.import и подменяет прежний только после того, как прочитан
+    весь поток: прежний каталог переименовывается в <path>.previous, собранный - в path, после чего прежний
+    удаляется. Прерванный импорт не трогает портфель, а столбцы разных импортов не смешиваются. Если процесс
+    оборвётся между двумя переименованиями, прежний портфель останется в <path>.previous"""
+
+    path = os.path.normpath(path)
+    staging_path, previous_path = path + '.import', path + '.previous'
+    shutil.rmtree(staging_path, ignore_errors=True)
+    os.makedirs(staging_path)
+    rows, skipped, start = 0, [], 0
+    files = {}
+    try:
+        try:
+            for field in COLUMN_DTYPES:
+                files[field] = open(_column_path(staging_path, field), 'wb')
+            for chunk in main._iter_chunks(applications, chunk_size):
+                # ошибки разбора и не словари превращаются в пустые строки, которые не пройдут проверку
+                prepared, valid = _prepare_rows({field: [application.get(field) if isinstance(application, dict)
+                                                         else None for application in chunk]
+                                                 for field in COLUMN_DTYPES})
+                skipped.extend((start + np.flatnonzero(~valid)).tolist())
+                for field, dtype in COLUMN_DTYPES.items():
+                    files[field].write(np.ascontiguousarray(prepared[field][valid], dtype=dtype).tobytes())
+                rows += int(valid.sum())
+                start += len(chunk)
+        finally:
+            for file in files.values():
+                file.close()
+        _write_meta(staging_path, rows)
+    except BaseException:
+        shutil.rmtree(staging_path, ignore_errors=True)
+        raise
+
+    if os.path.exists(path):
+        shutil.rmtree(previous_path, ignore_errors=True)
+        os.replace(path, previous_path)
+        os.replace(staging_path, path)
+        shutil.rmtree(previous_path)
+    else:
+        os.replace(staging_path, path)
+    return ImportResult(rows, skipped)
+
+
+class Portfolio:
+    """Портфель, открытый через numpy.memmap только для чтения"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = _read_meta(path)['rows']
+        self.columns = {field: np.memmap(_column_path(path, field), dtype=dtype, mode='r', shape=(self.rows,))
+                        if self.rows else np.empty(0, dtype=dtype)
+                        for field, dtype in COLUMN_DTYPES.items()}
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def score(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Tuple[int, Tuple[np.ndarray, ...]]]:
+        """Лениво считает портфель порциями по chunk_size строк.
+        Возвращает номер первой строки порции и результат batch.credit_decision_codes для неё"""
+
+        assert chunk_size >= 1, 'chunk_size: меньше 1'
+        for start in range(0, self.rows, chunk_size):
+            yield start, batch.credit_decision_codes(*(column[start:start + chunk_size]
+                                                       for column in self.columns.values()))
+
+    def score_all(self, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Считает весь портфель и возвращает решения, платежи и маски причин отказа одним набором массивов"""
+
+        verdicts = np.empty(self.rows, dtype=bool)
+        payments = np.empty(self.rows)
+        denial_masks = np.empty(self.rows, dtype=np.uint8)
+        for start, (chunk_verdicts, chunk_payments, chunk_denial_masks) in self.score(chunk_size):
+            end = start + len(chunk_verdicts)
+            verdicts[start:end], payments[start:end], denial_masks[start:end] = \
+                chunk_verdicts, chunk_payments, chunk_denial_masks
+
+        return verdicts, payments, denial_masks
+
+
+def open_portfolio(path: str) -> Portfolio:
+    """Открывает портфель для пересчёта"""
+
+    return Portfolio(path)
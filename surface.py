@@ -0,0 +1,150 @@
+"""Поверхность решений для быстрых запросов «что, если».
+
+Для категориального профиля заявителя (всё, кроме запрошенной суммы и срока) DecisionSurface один раз
+рассчитывает решения по сетке запрошенных сумм 0.1..10 с шагом sum_step и срокам 1..20 лет.
+После этого решения и наибольшие одобряемые суммы по сроку отдаются без расчёта.
+
+Все условия выдачи монотонны по запрошенной сумме при фиксированном сроке: лимит суммы, треть дохода,
+а годовой платёж растёт с суммой (производная 1/срок + ставка + модификаторы - 0.01 * (lg S + 1/ln 10) > 0).
+Поэтому одобряемые суммы при каждом сроке образуют отрезок [0.1, максимум]."""
+from decimal import Decimal
+from math import log10, nextafter
+from typing import Optional, Tuple
+
+import main
+
+MIN_SUM = Decimal('0.1')
+MAX_SUM = Decimal('10')
+MIN_PERIOD = 1
+MAX_PERIOD = 20
+_BISECTION_STEPS = 60
+
+
+class DecisionSurface:
+    """Решения по сетке (запрошенная сумма, срок) для одного профиля заявителя.
+    Поверхность отражает правила на момент построения, после их изменения её нужно построить заново"""
+
+    def __init__(self, age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+                 aim: str, sum_step: float = 0.1, engine: str = 'float'):
+        main._check_inputs(age, sex, income_source, last_year_income, credit_rating, 1, MIN_PERIOD, aim)
+        sum_step = Decimal(str(sum_step))
+        assert sum_step > 0, 'sum_step: должен быть больше 0'
+
+        self.profile = {'age': age, 'sex': sex, 'income_source': income_source,
+                        'last_year_income': last_year_income, 'credit_rating': credit_rating, 'aim': aim}
+        self.sum_step = float(sum_step)
+        self.sums = tuple(float(MIN_SUM + index * sum_step) for index in range(int((MAX_SUM - MIN_SUM) / sum_step) + 1))
+        self.periods = tuple(range(MIN_PERIOD, MAX_PERIOD + 1))
+
+        evaluate = main.ENGINES[engine]
+        self._decisions = {}
+        self._max_approvable = {}
+        for period in self.periods:
+            self._max_approvable[period] = None
+            for requested_sum in self.sums:
+                decision = evaluate(age, sex, income_source, last_year_income,
+                                    credit_rating, requested_sum, period, aim).as_tuple()
+                self._decisions[requested_sum, period] = decision
+                if decision[0]:
+                    self._max_approvable[period] = (requested_sum, decision[1])
+
+    def decision(self, requested_sum, repayment_period) -> Tuple[bool, Optional[float]]:
+        """Возвращает решение в формате credit_decision. Точки вне сетки рассчитываются заново"""
+
+        decision = self._decisions.get((requested_sum, repayment_period))
+        if decision is None:
+            decision = main.evaluate(requested_sum=requested_sum, repayment_period=repayment_period,
+                                     **self.profile).as_tuple()
+        return decision
+
+    def max_approvable(self, repayment_period: int) -> Optional[Tuple[float, float]]:
+        """Возвращает наибольшую одобряемую сумму сетки и годовой платёж по ней, None - ни одна сумма не одобряется"""
+
+        return self._max_approvable[repayment_period]
+
+    def max_approvable_by_period(self) -> dict:
+        """Возвращает max_approvable для всех сроков"""
+
+        return dict(self._max_approvable)
+
+    def max_approvable_sum(self, repayment_period) -> Optional[float]:
+        """Возвращает наибольшую одобряемую сумму без учёта шага сетки, None - ни одна сумма не одобряется.
+        Сумма находится из условий напрямую: пенсионный возраст и категориальные отказы не зависят от суммы,
+        лимит суммы и треть дохода дают верхнюю границу, а условие на половину дохода решается делением отрезка
+        пополам, потому что платёж растёт с суммой. Найденная во float граница проверяется точным расчётом
+        и при отказе сдвигается вниз, поэтому credit_decision одобряет возвращённую сумму"""
+
+        return max_approvable_sum(repayment_period=repayment_period, **self.profile)
+
+
+def _annual_payment(requested_sum: float, repayment_period, categorical_modifier: float) -> float:
+    """Годовой платёж без ограничения суммы во float"""
+
+    interest_rate = (float(main.BASIC_INTEREST_RATE) + categorical_modifier
+                     - log10(requested_sum) * float(main._SUM_MODIFIER_FACTOR))
+    return requested_sum * (1 + repayment_period * interest_rate) / repayment_period
+
+
+def max_approvable_sum(age: int, sex: str, income_source: str, last_year_income: float, credit_rating: int,
+                       repayment_period, aim: str) -> Optional[float]:
+    """Наибольшая одобряемая запрошенная сумма для профиля и срока, см. DecisionSurface.max_approvable_sum"""
+
+    if credit_rating == -2 or income_source == 'безработный':
+        return None
+    if age + repayment_period > main.PENSION_AGES[sex]:
+        return None
+
+    categorical_modifier, credit_sum_cap = main._FLOAT_RULE_TABLE[aim, credit_rating, income_source]
+    upper = min(float(MAX_SUM), last_year_income * repayment_period / 3)
+    if credit_sum_cap is not None:
+        upper = min(upper, credit_sum_cap)
+
+    payment_limit = last_year_income / 2
+    lower = float(MIN_SUM)
+    if upper < lower or _annual_payment(lower, repayment_period, categorical_modifier) > payment_limit:
+        return None
+    if _annual_payment(upper, repayment_period, categorical_modifier) > payment_limit:
+        for _ in range(_BISECTION_STEPS):
+            middle = (lower + upper) / 2
+            if _annual_payment(middle, repayment_period, categorical_modifier) <= payment_limit:
+                lower = middle
+            else:
+                upper = middle
+        upper = lower
+
+    def _approved(requested_sum):
+        return main.evaluate(age, sex, income_source, last_year_income, credit_rating, requested_sum,
+                             repayment_period, aim, trusted=True).verdict
+
+    return _approved_below(upper, _approved)
+
+
+def _approved_below(candidate: float, approved) -> Optional[float]:
+    """Уточняет найденную во float границу точным расчётом approved: условия трети дохода и половины дохода
+    в Decimal и с округлением платежа могут отклонить сумму у самой границы. Тогда шаг вниз удваивается
+    до первой одобренной суммы, и граница находится делением отрезка пополам (одобрение монотонно по сумме).
+    None - не одобряется и наименьшая сумма"""
+
+    if approved(candidate):
+        return candidate
+
+    lowest = float(MIN_SUM)
+    rejected, step = candidate, nextafter(candidate, 0) - candidate
+    while True:
+        lower = max(candidate + step, lowest)
+        if approved(lower):
+            break
+        if lower == lowest:
+            return None
+        rejected, step = lower, step * 2
+
+    for _ in range(_BISECTION_STEPS):
+        middle = (lower + rejected) / 2
+        if middle in (lower, rejected):
+            break
+        if approved(middle):
+            lower = middle
+        else:
+            rejected = middle
+
+    return lower
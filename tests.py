@@ -1,12 +1,48 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-
+from decimal import localcontext
+from functools import partial
+from io import BytesIO, StringIO
+from itertools import count, islice
+from random import Random
+from typing import Iterator
+from unittest import mock
+
+import incremental
+import instrumentation
+import main
+import rules
+import schedule
+import scorer
+import solver
 from main import credit_decision
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 BASE_OK_SCENARIO = {'age': 20, 'sex': 'M', 'income_source': 'наёмный работник', 'last_year_income': 2,
                     'credit_rating': 0, 'requested_sum': 0.1, 'repayment_period': 1, 'aim': 'ипотека'}
 
 
+def random_applications(count, seed=0):
+    """Возвращает воспроизводимый набор заявок в диапазонах входных данных из README"""
+    rnd = Random(seed)
+    return [{'age': rnd.randint(18, 70), 'sex': rnd.choice(['F', 'M']),
+             'income_source': rnd.choice(['пассивный доход', 'наёмный работник', 'собственный бизнес', 'безработный']),
+             'last_year_income': round(rnd.uniform(0, 10), 1), 'credit_rating': rnd.randint(-2, 2),
+             'requested_sum': round(rnd.uniform(0.1, 10), 2), 'repayment_period': rnd.randint(1, 20),
+             'aim': rnd.choice(['ипотека', 'развитие бизнеса', 'автокредит', 'потребительский'])}
+            for _ in range(count)]
+
+
 class CreditDecisionTestCases(unittest.TestCase):
 
     def setUp(self):
@@ -279,6 +315,14 @@ class InputDataTestCases(unittest.TestCase):
             self.test_data['credit_rating'] = '2'
             credit_decision(**self.test_data)
 
+        with self.assertRaises(AssertionError):
+            self.test_data['credit_rating'] = [1]
+            credit_decision(**self.test_data)
+
+        with self.assertRaises(AssertionError):
+            self.test_data['credit_rating'] = True
+            credit_decision(**self.test_data)
+
     def test_requested_sum_inputs(self):
         with self.assertRaises(AssertionError):
             self.test_data['requested_sum'] = None
@@ -347,5 +391,1006 @@ class InputDataTestCases(unittest.TestCase):
             credit_decision(**self.test_data)
 
 
+@unittest.skipUnless(numpy, 'numpy не установлен')
+class BatchDecisionTestCases(unittest.TestCase):
+
+    def setUp(self):
+        from batch import credit_decision_batch
+        self.credit_decision_batch = credit_decision_batch
+        self.applications = random_applications(2000) + [deepcopy(BASE_OK_SCENARIO)]
+
+    def _columns(self):
+        return {key: numpy.array([application[key] for application in self.applications])
+                for key in BASE_OK_SCENARIO}
+
+    def test_matches_scalar(self):
+        verdicts, payments, denial_masks = self.credit_decision_batch(**self._columns())
+
+        with mock.patch.object(main, 'VERBOSE', False):
+            for application, verdict, payment, denial_mask in zip(self.applications, verdicts, payments, denial_masks):
+                expected = credit_decision(**application)
+                self.assertEqual((bool(verdict), None if numpy.isnan(payment) else float(payment)), expected)
+                self.assertEqual(int(denial_mask), main.evaluate(**application).denial_mask)
+
+    def test_denial_mask(self):
+        self.applications = [deepcopy(BASE_OK_SCENARIO)]
+        self.applications[0]['credit_rating'] = -2
+        self.applications[0]['age'] = 60
+
+        verdicts, payments, denial_masks = self.credit_decision_batch(**self._columns())
+        self.assertFalse(verdicts[0])
+        self.assertTrue(numpy.isnan(payments[0]))
+        self.assertEqual(denial_masks[0], main.REASON_CREDIT_RATING | main.REASON_PENSION_AGE)
+
+    def test_invalid_category(self):
+        self.applications[0]['aim'] = 'просто так'
+        with self.assertRaises(AssertionError):
+            self.credit_decision_batch(**self._columns())
+
+    def test_validate_columns(self):
+        from batch import FIELD_ERRORS, validate_columns
+
+        self.applications = [deepcopy(BASE_OK_SCENARIO) for _ in range(4)]
+        self.applications[1].update(age=17, aim='просто так')
+        self.applications[2]['requested_sum'] = '5'
+        self.applications[3]['credit_rating'] = None
+        columns = {key: [application[key] for application in self.applications] for key in BASE_OK_SCENARIO}
+
+        self.assertEqual(validate_columns(**columns).tolist(),
+                         [0, FIELD_ERRORS['age'] | FIELD_ERRORS['aim'], FIELD_ERRORS['requested_sum'],
+                          FIELD_ERRORS['credit_rating']])
+
+    def test_validate_columns_flags_unrepresentable_values(self):
+        from batch import FIELD_ERRORS, validate_columns
+
+        self.applications = [deepcopy(BASE_OK_SCENARIO) for _ in range(5)]
+        self.applications[1]['credit_rating'] = [1]
+        self.applications[2]['aim'] = {'x': 1}
+        self.applications[3]['last_year_income'] = 10 ** 400
+        self.applications[4]['sex'] = ['M', 'F']
+        columns = {key: [application[key] for application in self.applications] for key in BASE_OK_SCENARIO}
+
+        self.assertEqual(validate_columns(**columns).tolist(),
+                         [0, FIELD_ERRORS['credit_rating'], FIELD_ERRORS['aim'], FIELD_ERRORS['last_year_income'],
+                          FIELD_ERRORS['sex']])
+
+        # столбец целиком из списков не разворачивается в двумерный массив
+        columns['aim'] = [['ипотека']] * len(self.applications)
+        self.assertTrue(all(validate_columns(**columns) & FIELD_ERRORS['aim']))
+
+    def test_validate_columns_matches_check_inputs(self):
+        from batch import validate_columns
+
+        values = {'age': [20, 17, 20.0, '20', None, True], 'sex': ['M', 'X', None, ['M']],
+                  'income_source': ['безработный', 'другое', 1], 'last_year_income': [1, 2.5, '3', None, [1]],
+                  'credit_rating': [0, -2, 3, 1.5, '2', None, 1.0, True, [1], {1: 1}],
+                  'requested_sum': [0.1, 10, 0, 11, '5'], 'repayment_period': [1, 20, 0.1, 21, '10'],
+                  'aim': ['ипотека', 'просто так', None, ['ипотека'], {'x': 1}]}
+        rnd = Random(0)
+        applications = [{key: rnd.choice(options) for key, options in values.items()} for _ in range(500)]
+        errors = validate_columns(**{key: [application[key] for application in applications] for key in values})
+
+        for application, error in zip(applications, errors):
+            try:
+                main._check_inputs(**application)
+                valid = True
+            except AssertionError:
+                valid = False
+            self.assertEqual(valid, error == 0, application)
+
+    def test_trusted(self):
+        with mock.patch('batch.validate_columns') as validate_mock, \
+                mock.patch('batch._numeric_errors') as numeric_errors_mock:
+            verdicts, _, _ = self.credit_decision_batch(**self._columns(), trusted=True)
+        validate_mock.assert_not_called()
+        numeric_errors_mock.assert_not_called()
+        self.assertEqual(len(verdicts), len(self.applications))
+
+
+class RuleTableTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_rule_table_entry(self):
+        self.assertEqual(main._RULE_TABLE['потребительский', -1, 'пассивный доход'],
+                         (main.Decimal('0.035'), main.Decimal(1)))
+        self.assertEqual(main._RULE_TABLE['автокредит', -2, 'безработный'], (main.Decimal('0'), None))
+
+    def test_rebuild_rule_table(self):
+        with mock.patch.dict(main.AIM_MODIFIERS, {'ипотека': main.Decimal('0')}):
+            main.rebuild_rule_table()
+            self.assertEqual(credit_decision(**self.test_data), (True, 0.11075))
+
+        main.rebuild_rule_table()
+        self.assertEqual(credit_decision(**self.test_data), (True, 0.10875))
+
+
+class StreamDecisionTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_jsonl_with_errors(self):
+        denied = dict(self.test_data, credit_rating=-2)
+        lines = [json.dumps(self.test_data), 'не json', json.dumps(dict(self.test_data, age=17)), '',
+                 json.dumps(denied)]
+        output = StringIO()
+
+        written = main.write_decisions(main.decide_applications(main.read_applications(StringIO('\n'.join(lines)))),
+                                       output)
+
+        decisions = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(written, 4)
+        self.assertEqual(decisions[0], {'index': 0, 'verdict': True, 'annual_payment': 0.10875,
+                                        'reasons': [], 'error': None})
+        self.assertTrue(decisions[1]['error'].startswith('JSONDecodeError'))
+        self.assertEqual(decisions[2]['error'], 'AssertionError: age: меньше 18')
+        self.assertEqual(decisions[3]['reasons'], ['Недостаточный кредитный рейтинг'])
+
+    def test_arithmetic_error_does_not_abort(self):
+        applications = [self.test_data, dict(self.test_data, last_year_income=10 ** 400), self.test_data]
+
+        for reasons in ('text', 'mask'):
+            decisions = list(main.decide_applications(applications, reasons=reasons))
+            self.assertEqual([decision['verdict'] for decision in decisions], [True, None, True])
+            self.assertTrue(decisions[1]['error'].startswith('OverflowError'))
+
+    def test_csv(self):
+        source = StringIO(','.join(BASE_OK_SCENARIO) + '\n' + ','.join(map(str, self.test_data.values())) + '\n')
+        output = StringIO()
+
+        main.write_decisions(main.decide_applications(main.read_applications(source, 'csv')), output, 'csv')
+
+        self.assertEqual(output.getvalue().splitlines(), ['index,verdict,annual_payment,reasons,error',
+                                                          '0,True,0.10875,,'])
+
+    def test_lazy(self):
+        applications = (dict(self.test_data, age=18 + index % 30) for index in count())
+        decisions = list(islice(main.decide_applications(applications, chunk_size=10), 25))
+
+        self.assertEqual([decision['index'] for decision in decisions], list(range(25)))
+
+    def test_parallel_matches_sequential(self):
+        applications = random_applications(500) + [{'age': 17}]
+
+        self.assertEqual(list(main.decide_applications_parallel(applications, chunk_size=37, max_workers=2)),
+                         list(main.decide_applications(applications)))
+
+
+class DecisionCacheTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+        self.cache = main.DecisionCache(maxsize=2)
+
+    def test_hits_and_evictions(self):
+        self.assertEqual(self.cache(**self.test_data), (True, 0.10875))
+        self.assertEqual(self.cache(**self.test_data), (True, 0.10875))
+        self.assertEqual(self.cache(**dict(self.test_data, credit_rating=-2)), (False, None))
+        self.assertEqual(self.cache(**dict(self.test_data, credit_rating=1)), (True, 0.1085))
+
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 3, 'evictions': 1, 'size': 2, 'maxsize': 2})
+
+    def test_matches_credit_decision(self):
+        cache = main.DecisionCache(maxsize=50)
+        with mock.patch.object(main, 'VERBOSE', False):
+            for application in random_applications(200) * 2:
+                self.assertEqual(cache(**application), credit_decision(**application))
+
+    def test_invalid_inputs(self):
+        with self.assertRaises(AssertionError):
+            self.cache(**dict(self.test_data, age=17))
+
+    def test_invalidated_by_interest_rate(self):
+        self.cache(**self.test_data)
+        with mock.patch.object(main, 'BASIC_INTEREST_RATE', main.Decimal('0.2')):
+            self.assertEqual(self.cache(**self.test_data), (True, 0.11875))
+
+        self.assertEqual(self.cache(**self.test_data), (True, 0.10875))
+        self.assertEqual(self.cache.stats()['hits'], 0)
+
+    def test_rules_changed_during_evaluation(self):
+        evaluate = main._evaluate
+
+        def _evaluate_with_rebuild(*arguments):
+            main.rebuild_rule_table()
+            return evaluate(*arguments)
+
+        with mock.patch.object(main, '_evaluate', side_effect=_evaluate_with_rebuild):
+            self.assertEqual(self.cache(**self.test_data), (True, 0.10875))
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+        self.cache(**self.test_data)
+        self.assertEqual(self.cache.stats()['size'], 1)
+
+
+class EvaluateTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_decision(self):
+        decision = main.evaluate(**self.test_data)
+
+        self.assertEqual(decision, (True, 0.10875, main.Decimal('0.1'), main.Decimal('-0.0125'), 0))
+        self.assertEqual(decision.as_tuple(), (True, 0.10875))
+        self.assertEqual(decision.reasons, [])
+
+    def test_denied_decision(self):
+        self.test_data['income_source'] = 'безработный'
+        decision = main.evaluate(**self.test_data)
+
+        self.assertFalse(decision.verdict)
+        self.assertEqual(decision.denial_mask, main.REASON_NO_INCOME)
+        self.assertEqual(decision.reasons, ['Нет источника постоянного дохода'])
+        self.assertEqual(decision.as_tuple(), (False, None))
+
+    def test_trusted_skips_checks(self):
+        self.test_data['age'] = 17
+        with self.assertRaises(AssertionError):
+            main.evaluate(**self.test_data)
+
+        with mock.patch.object(main, '_check_inputs') as check_inputs_mock:
+            self.assertTrue(main.evaluate(**self.test_data, trusted=True).verdict)
+        check_inputs_mock.assert_not_called()
+
+    def test_evaluate_does_not_print(self):
+        with mock.patch('builtins.print') as print_mock:
+            main.evaluate(**self.test_data)
+        print_mock.assert_not_called()
+
+    def test_format_decision(self):
+        self.test_data['credit_rating'] = -2
+        text = main.format_decision(main.evaluate(**self.test_data), self.test_data)
+
+        self.assertIn('Срок погашения: 1 г.,', text)
+        self.assertTrue(text.endswith("Кредит не выдаётся: ['Недостаточный кредитный рейтинг']"))
+
+    def test_credit_decision_prints_formatted_decision(self):
+        with mock.patch('builtins.print') as print_mock:
+            credit_decision(**self.test_data)
+        print_mock.assert_called_once_with(main.format_decision(main.evaluate(**self.test_data), self.test_data))
+
+
+class ScoringServerTestCases(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        from server import ScoringServer
+        self.server = ScoringServer(port=0, max_batch_size=8, max_delay=0.05)
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.close()
+
+    async def _request(self, method, path, payload=None):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.server.port)
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        writer.write(f'{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'
+                     .encode('latin-1') + body)
+        response = await reader.read()
+        writer.close()
+
+        head, _, body = response.partition(b'\r\n\r\n')
+        return int(head.split()[1]), json.loads(body)
+
+    async def test_concurrent_requests_are_batched(self):
+        applications = random_applications(20)
+        responses = await asyncio.gather(*(self._request('POST', '/decision', application)
+                                           for application in applications))
+
+        expected = [{key: decision[key] for key in decision if key != 'index'}
+                    for decision in main.decide_applications(applications)]
+        self.assertEqual([payload for _, payload in responses], expected)
+
+        status, metrics = await self._request('GET', '/metrics')
+        self.assertEqual(status, 200)
+        self.assertEqual(metrics['requests'], 20)
+        self.assertLess(metrics['batches'], 20)
+        self.assertIsNotNone(metrics['latency_p99_ms'])
+
+    async def test_errors(self):
+        self.assertEqual((await self._request('POST', '/decision', {'age': 17}))[0], 400)
+        self.assertEqual((await self._request('GET', '/unknown'))[0], 404)
+
+    async def test_bad_application_does_not_stall_batch(self):
+        responses = await asyncio.gather(
+            self._request('POST', '/decision', dict(BASE_OK_SCENARIO, last_year_income=10 ** 400)),
+            self._request('POST', '/decision', BASE_OK_SCENARIO))
+
+        self.assertEqual(responses[0][0], 400)
+        self.assertTrue(responses[0][1]['error'].startswith('OverflowError'))
+        self.assertEqual(responses[1],
+                         (200, {'verdict': True, 'annual_payment': 0.10875, 'reasons': [], 'error': None}))
+
+    async def test_batch_failure_reaches_only_failed_request(self):
+        decide_application = main._decide_application
+
+        def _decide_or_fail(application, *arguments):
+            if application['age'] == 99:
+                raise RuntimeError('сбой расчёта')
+            return decide_application(application, *arguments)
+
+        with mock.patch.object(main, '_decide_application', side_effect=_decide_or_fail):
+            failed, decided = await asyncio.gather(self.server.batcher.decide(dict(BASE_OK_SCENARIO, age=99)),
+                                                   self.server.batcher.decide(BASE_OK_SCENARIO),
+                                                   return_exceptions=True)
+
+        self.assertIsInstance(failed, RuntimeError)
+        self.assertEqual(decided['annual_payment'], 0.10875)
+        self.assertEqual(self.server.metrics.batches, 1)
+
+    async def test_scoring_failure_is_internal_server_error(self):
+        with mock.patch.object(main, '_decide_application', side_effect=RuntimeError('сбой расчёта')):
+            single = await self._request('POST', '/decision', BASE_OK_SCENARIO)
+            several = await self._request('POST', '/decision', [BASE_OK_SCENARIO] * 2)
+
+        self.assertEqual(single, (500, {'error': 'RuntimeError: сбой расчёта'}))
+        self.assertEqual(several, (500, {'error': 'RuntimeError: сбой расчёта'}))
+        self.assertEqual(await self._request('POST', '/decision', BASE_OK_SCENARIO),
+                         (200, {'verdict': True, 'annual_payment': 0.10875, 'reasons': [], 'error': None}))
+
+
+class BenchmarkTestCases(unittest.TestCase):
+
+    def test_generated_applications_are_reproducible_and_valid(self):
+        import bench
+
+        for workload in bench.WORKLOADS:
+            applications = bench.generate_applications(300, seed=7, workload=workload)
+            self.assertEqual(applications, bench.generate_applications(300, seed=7, workload=workload))
+            for application in applications:
+                main._check_inputs(**application)
+
+    def test_bench_scalar(self):
+        import bench
+
+        result = bench.bench_scalar(bench.generate_applications(20), verbose=True, repeat=1)
+        self.assertEqual(result['calls'], 20)
+        self.assertGreater(result['calls_per_sec'], 0)
+        self.assertTrue(main.VERBOSE)
+
+    def test_bench_startup(self):
+        import bench
+
+        application = bench.generate_applications(1)[0]
+        for mode in bench.STARTUP_MODES:
+            result = bench.bench_startup(mode, application, repeat=1)
+            self.assertEqual(result['ns_per_call'], result['import_ns'] + result['first_call_ns'])
+            self.assertGreater(result['first_call_ns'], 0)
+
+    def test_compare(self):
+        import bench
+
+        baseline = {'benchmarks': {'scalar/mixed': {'ns_per_call': 1000}, 'scalar/edge': {'ns_per_call': 1000}}}
+        results = {'benchmarks': {'scalar/mixed': {'ns_per_call': 1050}, 'scalar/edge': {'ns_per_call': 1200},
+                                  'batch/mixed': {'ns_per_call': 10}}}
+
+        self.assertEqual([regression['benchmark'] for regression in bench.compare(results, baseline, 0.1)],
+                         ['scalar/edge'])
+
+
+class FloatEngineTestCases(unittest.TestCase):
+
+    def test_matches_decimal_engine(self):
+        for application in random_applications(3000):
+            float_decision = main.evaluate(**application, engine='float')
+            decimal_decision = main.evaluate(**application)
+            self.assertEqual((float_decision.verdict, float_decision.annual_payment, float_decision.denial_mask),
+                             (decimal_decision.verdict, decimal_decision.annual_payment, decimal_decision.denial_mask))
+
+    def test_income_ratio_tie(self):
+        application = dict(BASE_OK_SCENARIO, requested_sum=0.8, repayment_period=3, last_year_income=0.8)
+
+        self.assertEqual(main.evaluate(**application, engine='float').denial_mask, main.REASON_INCOME_RATIO)
+
+
+class FloatEngineCreditDecisionTestCases(CreditDecisionTestCases):
+    """Примеры CreditDecisionTestCases на движке float"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(sys.modules[__name__], 'credit_decision',
+                                    partial(main.credit_decision, engine='float'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class FloatEngineCreditSumTestCases(CreditSumTestCases):
+    """Примеры CreditSumTestCases на движке float"""
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(sys.modules[__name__], 'credit_decision',
+                                    partial(main.credit_decision, engine='float'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class DecisionSurfaceTestCases(unittest.TestCase):
+
+    def setUp(self):
+        from surface import DecisionSurface
+        self.profile = {key: value for key, value in BASE_OK_SCENARIO.items()
+                        if key not in ('requested_sum', 'repayment_period')}
+        self.profile['last_year_income'] = 3
+        self.surface = DecisionSurface(**self.profile, sum_step=0.5)
+
+    def test_matches_credit_decision(self):
+        self.assertEqual(len(self.surface.sums), 20)
+        with mock.patch.object(main, 'VERBOSE', False):
+            for requested_sum in self.surface.sums:
+                for repayment_period in self.surface.periods:
+                    self.assertEqual(self.surface.decision(requested_sum, repayment_period),
+                                     credit_decision(requested_sum=requested_sum, repayment_period=repayment_period,
+                                                     **self.profile))
+
+    def test_off_grid_decision(self):
+        self.assertEqual(self.surface.decision(0.1, 1), credit_decision(**dict(self.profile, requested_sum=0.1,
+                                                                                  repayment_period=1)))
+
+    def test_max_approvable(self):
+        self.assertEqual(self.surface.max_approvable(1), (0.6, 0.64783109))
+        self.assertEqual(self.surface.max_approvable(20)[0], 4.6)
+        self.assertIsNone(self.surface.max_approvable_sum(60 - self.profile['age'] + 1))
+
+    def test_max_approvable_sum(self):
+        for repayment_period in self.surface.periods:
+            max_sum, _ = self.surface.max_approvable(repayment_period)
+            exact_max_sum = self.surface.max_approvable_sum(repayment_period)
+            self.assertLessEqual(max_sum, exact_max_sum)
+            self.assertLess(exact_max_sum, max_sum + self.surface.sum_step)
+            self.assertTrue(main.evaluate(**self.profile, requested_sum=exact_max_sum,
+                                          repayment_period=repayment_period).verdict)
+
+    def test_max_approvable_sum_at_income_ratio_boundary(self):
+        from surface import max_approvable_sum
+
+        profile = dict(self.profile, last_year_income=1)
+        max_sum = max_approvable_sum(**profile, repayment_period=3)
+        self.assertTrue(main.evaluate(**profile, requested_sum=max_sum, repayment_period=3).verdict)
+        self.assertFalse(main.evaluate(**profile, requested_sum=1.0, repayment_period=3).verdict)
+        self.assertGreater(max_sum, 0.99)
+
+    def test_unemployed(self):
+        from surface import max_approvable_sum
+
+        self.assertIsNone(max_approvable_sum(**dict(self.profile, income_source='безработный'), repayment_period=5))
+
+
+class QuickDecisionTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_approved(self):
+        self.assertEqual(main.quick_decision(**self.test_data), (True, 0.10875, 0))
+        self.assertTrue(main.is_approved(**self.test_data))
+
+    def test_early_reject_skips_payment(self):
+        evaluate_mock = mock.Mock(wraps=main._evaluate)
+        with mock.patch.dict(main.ENGINES, decimal=evaluate_mock):
+            self.assertEqual(main.quick_decision(**dict(self.test_data, credit_rating=-2,
+                                                        income_source='безработный')),
+                             (False, None, main.REASON_CREDIT_RATING | main.REASON_NO_INCOME))
+            self.assertFalse(main.is_approved(**dict(self.test_data, credit_rating=-2)))
+            evaluate_mock.assert_not_called()
+
+            # одобряемая заявка доходит до расчёта через тот же подменённый движок
+            self.assertTrue(main.is_approved(**self.test_data))
+        evaluate_mock.assert_called_once()
+
+    def test_payment_reason(self):
+        self.test_data.update(last_year_income=1, requested_sum=5, repayment_period=19)
+        self.assertEqual(main.quick_decision(**self.test_data),
+                         (False, None, main.REASON_PAYMENT_OVER_HALF_INCOME))
+
+        self.test_data.update(last_year_income=0.1)
+        self.assertEqual(main.quick_decision(**self.test_data), (False, None, main.REASON_INCOME_RATIO))
+
+    def test_matches_evaluate(self):
+        for application in random_applications(2000):
+            decision = main.evaluate(**application)
+            verdict, annual_payment, denial_mask = main.quick_decision(**application)
+            self.assertEqual((verdict, annual_payment), decision.as_tuple())
+            self.assertEqual(denial_mask & ~main.REASON_PAYMENT_OVER_HALF_INCOME,
+                             decision.denial_mask & ~main.REASON_PAYMENT_OVER_HALF_INCOME)
+            self.assertEqual(main.is_approved(**application), decision.verdict)
+
+    def test_stream_mask_reasons(self):
+        applications = [self.test_data, dict(self.test_data, credit_rating=-2), {'age': 17}]
+        decisions = list(main.decide_applications(applications, reasons='mask'))
+
+        self.assertEqual([decision['reasons'] for decision in decisions], [0, main.REASON_CREDIT_RATING, 0])
+        self.assertIsNotNone(decisions[2]['error'])
+
+
+@unittest.skipUnless(numpy, 'numpy не установлен')
+class PortfolioStoreTestCases(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, 'portfolio')
+        self.applications = random_applications(500)
+        self.columns = {key: [application[key] for application in self.applications] for key in BASE_OK_SCENARIO}
+
+    def test_write_append_and_score(self):
+        import store
+        from batch import credit_decision_batch
+
+        self.assertEqual(store.write_portfolio(self.path, {key: column[:300] for key, column in self.columns.items()}),
+                         300)
+        self.assertEqual(store.write_portfolio(self.path, {key: column[300:] for key, column in self.columns.items()},
+                                               append=True), 500)
+
+        portfolio = store.open_portfolio(self.path)
+        self.assertEqual(len(portfolio), 500)
+        self.assertIsInstance(portfolio.columns['requested_sum'], numpy.memmap)
+
+        for actual, expected in zip(portfolio.score_all(chunk_size=128), credit_decision_batch(**self.columns)):
+            numpy.testing.assert_array_equal(actual, expected)
+
+    def test_import_applications(self):
+        import store
+
+        self.assertEqual(store.import_applications(self.path, iter(self.applications), chunk_size=64), (500, []))
+        portfolio = store.open_portfolio(self.path)
+        self.assertEqual(portfolio.columns['aim'].dtype, numpy.uint8)
+        self.assertEqual([start for start, _ in portfolio.score(chunk_size=200)], [0, 200, 400])
+
+    def test_import_skips_invalid_rows(self):
+        import store
+
+        lines = [json.dumps(application) for application in self.applications[:100]]
+        lines[5] = 'не json'
+        lines[70] = json.dumps(dict(self.applications[70], age=17))
+        lines[71] = json.dumps({'age': 30})
+        lines[72] = json.dumps(dict(self.applications[72], aim=['ипотека']))
+        rows, skipped = store.import_applications(self.path, main.read_applications(StringIO('\n'.join(lines))),
+                                                  chunk_size=32)
+
+        self.assertEqual((rows, skipped), (96, [5, 70, 71, 72]))
+        kept = [application for index, application in enumerate(self.applications[:100]) if index not in skipped]
+        numpy.testing.assert_array_equal(store.open_portfolio(self.path).columns['requested_sum'],
+                                         [application['requested_sum'] for application in kept])
+
+    def test_interrupted_import_keeps_portfolio(self):
+        import store
+
+        store.write_portfolio(self.path, self.columns)
+
+        def _applications():
+            yield from self.applications[:100]
+            raise OSError('обрыв потока')
+
+        with self.assertRaises(OSError):
+            store.import_applications(self.path, _applications(), chunk_size=32)
+        self.assertEqual(len(store.open_portfolio(self.path)), 500)
+        self.assertEqual(os.listdir(self.directory), ['portfolio'])
+
+    def test_import_replaces_portfolio_as_a_whole(self):
+        import store
+
+        store.write_portfolio(self.path, self.columns)
+        with open(os.path.join(self.path, 'aim.bin'), 'rb') as file:
+            old_aim = file.read()
+        # прежний портфель, открытый до импорта, читается целиком из прежних файлов
+        portfolio = store.open_portfolio(self.path)
+
+        self.assertEqual(store.import_applications(self.path, iter(self.applications[:100])), (100, []))
+        self.assertEqual(os.listdir(self.directory), ['portfolio'])
+        self.assertEqual(len(store.open_portfolio(self.path)), 100)
+        self.assertEqual(portfolio.columns['aim'].tobytes(), old_aim)
+
+    def test_invalid_rows_are_not_written(self):
+        import store
+
+        self.columns['age'][3] = 17
+        with self.assertRaises(AssertionError):
+            store.write_portfolio(self.path, self.columns)
+
+
+class InstrumentationTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(main.INSTRUMENTATION)
+
+    def test_stages_and_decisions(self):
+        with instrumentation.instrumented() as metrics, mock.patch.object(main, 'VERBOSE', False):
+            self.assertEqual(credit_decision(**self.test_data), (True, 0.10875))
+            credit_decision(**dict(self.test_data, age=60, credit_rating=-2))
+        self.assertIsNone(main.INSTRUMENTATION)
+
+        snapshot = metrics.as_dict()
+        self.assertEqual(set(snapshot['stages']), {'validation', 'evaluate_decimal', 'credit_sum',
+                                                   'interest_rate_modifier', 'annual_payment', 'quantization',
+                                                   'denial_checks'})
+        self.assertEqual(snapshot['stages']['validation']['calls'], 2)
+        self.assertEqual(snapshot['decisions'], {'total': 2, 'approved': 1, 'denied': 1})
+        self.assertEqual(snapshot['denial_reasons']['pension_age'], 1)
+        self.assertEqual(snapshot['denial_reasons']['credit_rating'], 1)
+        self.assertEqual(snapshot['denial_reasons']['no_income'], 0)
+
+    def test_printing_and_float_fallbacks(self):
+        with instrumentation.instrumented() as metrics, mock.patch('sys.stdout', new=StringIO()):
+            credit_decision(**dict(self.test_data, last_year_income=0.8, requested_sum=0.8, repayment_period=3),
+                            engine='float')
+
+        snapshot = metrics.as_dict()
+        self.assertEqual(snapshot['stages']['printing']['calls'], 1)
+        self.assertEqual(snapshot['counters'], {'float_fallbacks': 1})
+
+    def test_cache_and_prometheus(self):
+        metrics = instrumentation.Instrumentation()
+        cache = main.DecisionCache()
+        metrics.track_cache('default', cache)
+        cache(**self.test_data)
+        cache(**self.test_data)
+        self.assertEqual(metrics.as_dict()['caches']['default']['hit_rate'], 0.5)
+
+        with instrumentation.instrumented(metrics):
+            list(main.decide_applications([self.test_data, dict(self.test_data, income_source='безработный')]))
+        text = metrics.to_prometheus()
+        self.assertIn('credit_cache_hits_total{cache="default"} 1', text)
+        self.assertIn('credit_decisions_total{verdict="denied"} 1', text)
+        self.assertIn('credit_denial_reasons_total{reason="no_income"} 1', text)
+        self.assertIn('# TYPE credit_stage_seconds_total counter', text)
+
+
+class RuleSetTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_default_rule_set_matches_evaluate(self):
+        for engine in main.ENGINES:
+            score = rules.compile_rule_set(rules.default_rule_set(), engine)
+            for application in random_applications(300):
+                self.assertEqual(score(**application), main.evaluate(**application, engine=engine))
+
+    def test_partial_override(self):
+        rule_set = rules.rule_set_from_dict({'name': 'variant', 'basic_interest_rate': '0.2', 'pension_ages': {'M': 21},
+                                             'caps': {'income_source': {'наёмный работник': 2}}})
+        self.assertEqual(rule_set.modifiers, rules.default_rule_set().modifiers)
+        self.assertEqual(rule_set.caps['credit_rating'], main.CREDIT_RATING_CAPS)
+
+        score = rules.compile_rule_set(rule_set)
+        self.assertEqual(score(**self.test_data).as_tuple(), (True, 0.11875))
+        self.assertEqual(score(**dict(self.test_data, repayment_period=2)).denial_mask, main.REASON_PENSION_AGE)
+        self.assertEqual(score(**dict(self.test_data, requested_sum=3, last_year_income=10)).denial_mask,
+                         main.REASON_SUM_OVER_ALLOWED)
+
+    def test_load_json_and_toml(self):
+        with tempfile.TemporaryDirectory() as directory:
+            json_path = f'{directory}/promo.json'
+            with open(json_path, 'w', encoding='utf-8') as file:
+                json.dump({'modifiers': {'credit_rating': {'0': '0.01'}}, 'caps': {'credit_rating': {'-2': None}}},
+                          file)
+            toml_path = f'{directory}/strict.toml'
+            with open(toml_path, 'w', encoding='utf-8') as file:
+                file.write('basic_interest_rate = "0.2"\n[caps.credit_rating]\n"2" = 1\n'
+                           '[caps.income_source]\n"собственный бизнес" = false\n')
+
+            promo = rules.load_rule_set(json_path)
+            self.assertEqual(promo.name, 'promo')
+            self.assertEqual(rules.compile_rule_set(promo)(**self.test_data).as_tuple(), (True, 0.10975))
+
+            if rules.tomllib is not None:
+                strict = rules.load_rule_set(toml_path)
+                self.assertEqual(strict.caps['credit_rating'][2], 1)
+                self.assertIsNone(strict.caps['income_source']['собственный бизнес'])
+
+    def test_round_trip(self):
+        rule_set = rules.default_rule_set()
+        self.assertEqual(rules.rule_set_from_dict(json.loads(json.dumps(rules.rule_set_to_dict(rule_set)))),
+                         rule_set)
+
+    def test_invalid_rule_sets(self):
+        for data in ({'rate': '0.1'}, {'modifiers': {'aim': {'ремонт': '0'}}}, {'pension_ages': {'M': 'шестьдесят'}},
+                     {'caps': {'credit_rating': {'1': -1}}}, {'caps': {'aim': {}}}):
+            with self.assertRaises(AssertionError):
+                rules.rule_set_from_dict(data)
+
+    def test_apply_rule_set_drives_main(self):
+        self.addCleanup(rules.apply_rule_set, rules.default_rule_set())
+        rule_set = rules.rule_set_from_dict({'basic_interest_rate': '0.2', 'sum_modifier_factor': '0.02',
+                                             'pension_ages': {'M': 50}, 'modifiers': {'aim': {'ипотека': '0.01'}}})
+        applications = random_applications(300)
+        expected = {engine: [rules.compile_rule_set(rule_set, engine)(**application) for application in applications]
+                    for engine in main.ENGINES}
+
+        rules.apply_rule_set(rule_set)
+        for engine in main.ENGINES:
+            self.assertEqual([main.evaluate(**application, engine=engine) for application in applications],
+                             expected[engine])
+        self.assertEqual([decision['verdict'] for decision in main.decide_applications(applications)],
+                         [decision.verdict for decision in expected['decimal']])
+
+        if numpy is not None:
+            from batch import credit_decision_batch
+
+            verdicts, _, denial_masks = credit_decision_batch(
+                **{field: [application[field] for application in applications] for field in BASE_OK_SCENARIO})
+            self.assertEqual(verdicts.tolist(), [decision.verdict for decision in expected['decimal']])
+            self.assertEqual(denial_masks.tolist(), [decision.denial_mask for decision in expected['decimal']])
+
+    def test_parallel_workers_use_applied_rules(self):
+        import multiprocessing
+
+        self.addCleanup(rules.apply_rule_set, rules.default_rule_set())
+        rules.apply_rule_set(rules.rule_set_from_dict({'basic_interest_rate': '0.2'}))
+        applications = random_applications(100)
+
+        # при spawn рабочие процессы заново импортируют main и без переданных правил считали бы по умолчанию
+        self.assertEqual(list(main.decide_applications_parallel(applications, chunk_size=30, max_workers=2,
+                                                                mp_context=multiprocessing.get_context('spawn'))),
+                         list(main.decide_applications(applications)))
+
+    def test_cli_rules(self):
+        self.addCleanup(rules.apply_rule_set, rules.default_rule_set())
+        with tempfile.TemporaryDirectory() as directory:
+            with open(f'{directory}/high.json', 'w', encoding='utf-8') as file:
+                json.dump({'basic_interest_rate': '0.2'}, file)
+            with open(f'{directory}/applications.jsonl', 'w', encoding='utf-8') as file:
+                file.write(json.dumps(self.test_data) + '\n')
+
+            main.cli(['--rules', f'{directory}/high.json', f'{directory}/applications.jsonl',
+                      '-o', f'{directory}/decisions.jsonl'])
+            with open(f'{directory}/decisions.jsonl', encoding='utf-8') as file:
+                self.assertEqual(json.loads(file.read())['annual_payment'], 0.11875)
+
+    def test_registry_keeps_rule_sets_apart(self):
+        registry = rules.RuleSetRegistry()
+        registry.add(rules.default_rule_set())
+        registry.add(rules.rule_set_from_dict({'name': 'high', 'basic_interest_rate': '0.2'}))
+
+        self.assertEqual(list(registry), ['default', 'high'])
+        self.assertEqual(registry.scorer('default')(**self.test_data).annual_payment, 0.10875)
+        self.assertEqual(registry.scorer('high', 'float')(**self.test_data).annual_payment, 0.11875)
+
+        registry.remove('high')
+        self.assertNotIn('high', registry)
+        self.assertEqual(len(registry), 1)
+
+
+class IncrementalScorerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.applications = random_applications(1000)
+        self.scorer = incremental.IncrementalScorer(self.applications)
+
+    def assertMatchesFullRescore(self):
+        score = rules.compile_rule_set(self.scorer.rule_set)
+        for index, application in enumerate(self.applications):
+            self.assertEqual(self.scorer.decision(index), score(**application))
+
+    def test_initial_decisions(self):
+        self.assertEqual(len(self.scorer), 1000)
+        self.assertEqual(self.scorer.decisions(), [main.evaluate(**application) for application in self.applications])
+
+    def test_modifier_change_recomputes_affected_rows_only(self):
+        rule_set = rules.rule_set_from_dict({'modifiers': {'aim': {'потребительский': '1'}}})
+        changes = self.scorer.update(rule_set)
+
+        self.assertEqual(self.scorer.recomputed_rows,
+                         sum(application['aim'] == 'потребительский' for application in self.applications))
+        self.assertTrue(changes)
+        for change in changes:
+            self.assertEqual(self.applications[change.index]['aim'], 'потребительский')
+            self.assertTrue(change.before.verdict)
+            self.assertFalse(change.after.verdict)
+        self.assertMatchesFullRescore()
+
+    def test_pension_age_and_rate_changes(self):
+        self.scorer.update(rules.rule_set_from_dict({'pension_ages': {'F': 45}}))
+        self.assertEqual(self.scorer.recomputed_rows,
+                         sum(application['sex'] == 'F' for application in self.applications))
+        self.assertMatchesFullRescore()
+
+        rule_set = rules.rule_set_from_dict({'basic_interest_rate': '0.05', 'caps': {'credit_rating': {'0': 2}}},
+                                            self.scorer.rule_set)
+        self.scorer.update(rule_set)
+        self.assertEqual(self.scorer.recomputed_rows, 1000)
+        self.assertMatchesFullRescore()
+
+    def test_all_changes(self):
+        rule_set = rules.rule_set_from_dict({'modifiers': {'credit_rating': {'2': '-0.01'}}})
+        flipped = self.scorer.update(rule_set)
+        self.assertEqual(self.scorer.update(rule_set), [])
+
+        changes = incremental.IncrementalScorer(self.applications).update(rule_set, flipped_only=False)
+        self.assertLessEqual(len(flipped), len(changes))
+        self.assertTrue(all(change.before.annual_payment != change.after.annual_payment for change in changes))
+
+
+class ScheduleTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_annual(self):
+        self.assertEqual(list(schedule.amortization_schedule(**self.test_data)),
+                         [schedule.ScheduleRow(1, 0.10875, 0.1, 0.00875, 0.0)])
+
+        application = dict(self.test_data, requested_sum=2, repayment_period=4, last_year_income=10)
+        _, annual_payment = credit_decision(**application)
+        rows = list(schedule.amortization_schedule(**application))
+        self.assertEqual([row.number for row in rows], [1, 2, 3, 4])
+        self.assertTrue(all(row.payment == annual_payment for row in rows))
+        self.assertEqual([row.balance for row in rows], [1.5, 1.0, 0.5, 0.0])
+
+    def test_monthly(self):
+        rows = list(schedule.amortization_schedule(**self.test_data, frequency='monthly'))
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0], schedule.ScheduleRow(1, 0.0090625, 0.00833333, 0.00072917, 0.09166667))
+        self.assertEqual(rows[-1], schedule.ScheduleRow(12, 0.00906254, 0.00833337, 0.00072917, 0.0))
+
+    def test_fractional_period(self):
+        rows = list(schedule.iter_schedule(1, '0.1', 1.5))
+        self.assertEqual(rows, [schedule.ScheduleRow(1, 0.76666667, 0.66666667, 0.1, 0.33333333),
+                                schedule.ScheduleRow(2, 0.38333333, 0.33333333, 0.05, 0.0)])
+
+    def test_denied_and_lazy(self):
+        self.assertEqual(list(schedule.amortization_schedule(**dict(self.test_data, credit_rating=-2))), [])
+        self.assertIsInstance(schedule.amortization_schedule(**self.test_data), Iterator)
+        with self.assertRaises(AssertionError):
+            schedule.amortization_schedule(**dict(self.test_data, age=17))
+
+    @unittest.skipUnless(numpy, 'numpy не установлен')
+    def test_write_schedules_matches_generator(self):
+        applications = random_applications(300)
+        columns = {key: [application[key] for application in applications] for key in BASE_OK_SCENARIO}
+        for frequency in schedule.PERIODS_PER_YEAR:
+            expected = [(index, *row) for index, application in enumerate(applications)
+                        for row in schedule.amortization_schedule(**application, frequency=frequency)]
+
+            stream = StringIO()
+            self.assertEqual(schedule.write_schedules(stream, **columns, frequency=frequency, chunk_size=7),
+                             len(expected))
+            lines = stream.getvalue().splitlines()
+            self.assertEqual(lines[0], ','.join(schedule.SCHEDULE_FIELDS))
+            self.assertEqual([tuple(int(value) if position < 2 else float(value)
+                                    for position, value in enumerate(line.split(','))) for line in lines[1:]],
+                             expected)
+
+            binary_stream = BytesIO()
+            schedule.write_schedules(binary_stream, **columns, frequency=frequency, output_format='binary')
+            records = numpy.frombuffer(binary_stream.getvalue(), dtype=schedule.SCHEDULE_RECORD_FORMAT)
+            self.assertEqual(records.tolist(), expected)
+
+    @unittest.skipUnless(numpy, 'numpy не установлен')
+    def test_write_schedules_blocks_by_rows(self):
+        columns = {key: [application[key] for application in random_applications(200)] for key in BASE_OK_SCENARIO}
+        for output_format, stream_type in (('csv', StringIO), ('binary', BytesIO)):
+            expected = stream_type()
+            rows = schedule.write_schedules(expected, **columns, frequency='monthly', output_format=output_format)
+            for chunk_size, max_rows in ((1000, 1), (1000, 100), (3, 1000)):
+                stream = stream_type()
+                self.assertEqual(schedule.write_schedules(stream, **columns, frequency='monthly',
+                                                          output_format=output_format, chunk_size=chunk_size,
+                                                          max_rows=max_rows), rows)
+                self.assertEqual(stream.getvalue(), expected.getvalue())
+
+
+class CreditScorerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+        self.scorer = scorer.CreditScorer()
+
+    def test_matches_evaluate(self):
+        for application in random_applications(500):
+            self.assertEqual(self.scorer.evaluate(**application), main.evaluate(**application))
+
+    def test_thread_pool(self):
+        applications = random_applications(2000, seed=1)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            decisions = list(executor.map(lambda application: self.scorer(**application), applications))
+
+        self.assertEqual(decisions, [main.evaluate(**application).as_tuple() for application in applications])
+
+    def test_independent_of_globals(self):
+        with mock.patch.object(main, 'BASIC_INTEREST_RATE', main.Decimal('0.2')), localcontext() as context:
+            context.prec = 3
+            self.assertEqual(self.scorer(**self.test_data), (True, 0.10875))
+
+        with mock.patch('sys.stdout', new=StringIO()) as stdout:
+            self.scorer(**self.test_data)
+            scorer.CreditScorer(verbose=True)(**self.test_data)
+        self.assertEqual(stdout.getvalue().count('Кредит: выдаётся'), 1)
+
+    def test_own_rule_set_and_context(self):
+        high_rate = scorer.CreditScorer(rules.rule_set_from_dict({'basic_interest_rate': '0.2'}))
+        self.assertEqual(high_rate(**self.test_data), (True, 0.11875))
+
+        rounded = scorer.CreditScorer(context=main.Context(prec=10))
+        self.assertEqual(rounded.evaluate(**dict(self.test_data, requested_sum=0.3)).rate_modifier,
+                         main.Decimal('-0.01727121255'))
+
+
+class SolverTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_counter_offer(self):
+        self.assertEqual(solver.counter_offer(**dict(self.test_data, requested_sum=1)),
+                         solver.CounterOffer(0.66, 0.71234101, 2, 0.5775))
+        self.assertEqual(solver.counter_offer(**dict(self.test_data, credit_rating=-2)),
+                         solver.CounterOffer(None, None, None, None))
+        self.assertEqual(solver.counter_offer(**dict(self.test_data, age=59, repayment_period=2)),
+                         solver.CounterOffer(None, None, 1, 0.10875))
+
+    def test_matches_brute_force(self):
+        for application in random_applications(40, seed=2):
+            approved_sums = [(index / 10, main.evaluate(**dict(application, requested_sum=index / 10)))
+                             for index in range(1, 101)]
+            approved_sums = [(requested_sum, decision.annual_payment)
+                             for requested_sum, decision in approved_sums if decision.verdict]
+            approved_periods = [(period, main.evaluate(**dict(application, repayment_period=period)))
+                                for period in range(1, 21)]
+            approved_periods = [(period, decision.annual_payment)
+                                for period, decision in approved_periods if decision.verdict]
+
+            self.assertEqual(solver.counter_offer(**application, sum_precision=1),
+                             solver.CounterOffer(*(approved_sums[-1] if approved_sums else (None, None)),
+                                                 *(approved_periods[0] if approved_periods else (None, None))))
+
+    @unittest.skipUnless(numpy, 'numpy не установлен')
+    def test_batch_matches_scalar(self):
+        applications = random_applications(500, seed=3)
+        columns = {key: [application[key] for application in applications] for key in BASE_OK_SCENARIO}
+        offers = solver.counter_offers_batch(**columns, period_precision=1)
+
+        for index, application in enumerate(applications):
+            self.assertEqual(tuple(None if numpy.isnan(column[index]) else column[index] for column in offers),
+                             tuple(solver.counter_offer(**application, period_precision=1)))
+
+
+class WorkerTestCases(unittest.TestCase):
+
+    def setUp(self):
+        self.test_data = deepcopy(BASE_OK_SCENARIO)
+
+    def test_main_import_is_light(self):
+        import subprocess
+
+        output = subprocess.run([sys.executable, '-c', 'import sys, main, worker; print(sorted(set(sys.modules) & '
+                                 '{"argparse", "csv", "json", "concurrent.futures", "numpy", "asyncio", "batch"}))'],
+                                capture_output=True, check=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(main.__file__))).stdout
+        self.assertEqual(output.strip(), '[]')
+
+    def test_warm_up(self):
+        with mock.patch('sys.stdout', new=StringIO()) as stdout:
+            main.warm_up()
+        self.assertEqual(stdout.getvalue(), '')
+
+        with mock.patch.dict(main.AIM_MODIFIERS, {'ипотека': main.Decimal('0')}):
+            main.warm_up(('float',))
+            self.assertEqual(main._RULE_TABLE['ипотека', 0, 'наёмный работник'][0], main.Decimal('-0.0025'))
+        main.rebuild_rule_table()
+
+    def test_handle(self):
+        import worker
+
+        self.assertEqual(worker.handle(self.test_data),
+                         {'verdict': True, 'annual_payment': 0.10875, 'reasons': [], 'error': None})
+        decisions = worker.handle([self.test_data, dict(self.test_data, age=17)], reasons='mask')
+        self.assertEqual([decision['verdict'] for decision in decisions], [True, None])
+
+    def test_run(self):
+        import worker
+
+        output = StringIO()
+        self.assertEqual(worker.run(StringIO(json.dumps(self.test_data) + '\n'), output), 1)
+        self.assertEqual(json.loads(output.getvalue())['annual_payment'], 0.10875)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,38 @@
+"""Лёгкая точка входа для короткоживущих процессов и serverless-обработчиков.
+
+Импортирует только main (без argparse, пула процессов, NumPy и HTTP-сервера) и сразу вызывает main.warm_up,
+поэтому подготовка расчёта проходит при импорте, например на этапе инициализации serverless-окружения,
+а не на первой заявке.
+
+    from worker import handle
+    handle({'age': 30, 'sex': 'F', ...})  # решение в формате main.decide_applications, без поля index
+    handle([application, ...])             # список решений
+
+python worker.py < applications.jsonl > decisions.jsonl"""
+import sys
+from typing import TextIO, Union
+
+import main
+
+main.warm_up()
+
+
+def handle(event: Union[dict, list], engine: str = 'decimal', reasons: str = 'text') -> Union[dict, list]:
+    """Возвращает решение по заявке или список решений по списку заявок, ничего не печатая.
+    Ошибки входных данных возвращаются в поле error, как в main.decide_applications"""
+
+    if isinstance(event, list):
+        return main._decide_chunk(event, engine, reasons)
+    return main._decide_application(event, engine, reasons)
+
+
+def run(input_stream: TextIO = sys.stdin, output_stream: TextIO = sys.stdout, engine: str = 'decimal') -> int:
+    """Принимает решения по заявкам JSONL из input_stream и пишет их в output_stream.
+    Возвращает количество решений"""
+
+    return main.write_decisions(main.decide_applications(main.read_applications(input_stream), engine=engine),
+                                output_stream)
+
+
+if __name__ == '__main__':
+    run()